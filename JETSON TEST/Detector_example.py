@@ -1,21 +1,30 @@
 import cv2
 import numpy as np
 import insightface
+from insightface.utils import face_align
 import os
 from collections import deque
 import time
-from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, firestore
 from pathlib import Path
 import json
 import sounddevice as sd
-from scipy.io.wavfile import write
-import tempfile
 from resemblyzer import VoiceEncoder, preprocess_wav
+from audio_ring import AudioRingBuffer, VoiceActivityDetector
 import threading
 from sinch import SinchClient
-import requests
+from gallery import Gallery
+from gallery_snapshot import GALLERY_FIELDS, GallerySnapshot, parse_upload_document
+from gallery_sync import GallerySync
+from frame_pipeline import FramePipeline
+from stream_state import StreamState
+from motion_gate import FULL_REGION, MotionGate
+from governor import DEFAULT_THERMAL_ZONE_TYPES, PerformanceGovernor
+from alert_dispatcher import AlertDispatcher, SinchSmsTransport
+from location_provider import LocationProvider
+from evidence_writer import EvidenceWriter
+from state_store import DetectionStateStore
 
 # Load environment variables from .env file
 try:
@@ -33,43 +42,132 @@ except ImportError:
     pass
 
 
+# InsightFace modules needed to produce face embeddings. Other buffalo_l modules
+# (genderage, landmark_2d_106, landmark_3d_68) are opt-in via face_modules.
+REQUIRED_FACE_MODULES = ('detection', 'recognition')
+
+
 class FirebaseFaceDetector:
     def __init__(self, similarity_threshold=0.35, 
                  smoothing_frames=5, save_outputs=False, 
                  use_gpu=False, detection_size=320, frame_skip=1, 
                  process_resolution=480, voice_similarity_threshold=0.3,
-                 enable_voice=True, voice_chunk_duration=1.0,
+                 enable_voice=True, voice_chunk_duration=1.0, voice_hop_duration=0.5,
+                 voice_vad_aggressiveness=2, voice_max_matches=5,
                  enable_sms=True, sinch_key_id=None, sinch_key_secret=None, 
-                 sinch_project_id=None, sinch_from_number=None):
+                 sinch_project_id=None, sinch_from_number=None,
+                 face_modules=None, match_top_k=3, gallery_index='auto', gallery_nprobe=8,
+                 face_aggregation='max', face_aggregation_top_n=3,
+                 snapshot_dir='gallery_cache', gallery_sync_interval=30.0,
+                 pipeline_queue_size=1, reembed_interval=10, unknown_reembed_interval=3,
+                 alert_transport=None, alert_queue_path='alert_queue.json',
+                 camera_location=None, gps_port=None, location_ttl=3600.0,
+                 evidence_jpeg_quality=90, evidence_queue_size=16, evidence_drop_policy='drop_newest',
+                 state_path='detector_state.db', motion_gating=False, camera_rois=None,
+                 motion_threshold=25, motion_refresh_interval=2.0,
+                 adaptive_quality=False, target_latency=0.25, thermal_limit=80.0,
+                 thermal_zone_types=DEFAULT_THERMAL_ZONE_TYPES):
         """
         Face and voice detection system that loads embeddings from Firebase Firestore.
         
         Args:
             similarity_threshold: Minimum cosine similarity to consider a face match
-            smoothing_frames: Number of frames to average similarity over
+            smoothing_frames: Number of recognitions per tracked face to average similarity
+                              and vote identity over
             save_outputs: Whether to save processed frames and embeddings
             use_gpu: Whether to use GPU for face detection
             detection_size: Size for face detection model
-            frame_skip: Process every Nth frame (0 = all frames)
+            frame_skip: Process every Nth frame (0 = all frames) in process_frame();
+                        run() always runs inference on the latest captured frame
             process_resolution: Maximum resolution for processing
             voice_similarity_threshold: Minimum cosine similarity for voice match
             enable_voice: Whether to enable voice detection
-            voice_chunk_duration: Duration in seconds for each voice detection chunk
+            voice_chunk_duration: Duration in seconds of the audio window each voice embedding is computed on
+            voice_hop_duration: Seconds between successive (overlapping) voice windows
+            voice_vad_aggressiveness: Voice activity detection strictness, 0 (lenient) to 3 (strict);
+                                      windows without speech are not embedded
+            voice_max_matches: Most voice matches (speakers) kept per audio window
+            face_modules: Extra InsightFace modules to load besides detection and
+                          recognition (e.g. ['genderage']); None loads only those two
+            match_top_k: Number of gallery candidates kept per face (best match plus runner-ups)
+            gallery_index: Face gallery search backend: 'exact' (brute force), 'ivf'
+                           (approximate, clustered) or 'auto' (IVF for large galleries)
+            gallery_nprobe: Clusters scanned per face by the IVF index (higher = better recall, slower)
+            face_aggregation: How the scores of a person's photos combine into one score: 'max'
+                              (best photo), 'mean_top_n' (mean of the best face_aggregation_top_n
+                              photos) or 'centroid' (compare against the person's average face)
+            face_aggregation_top_n: Photos averaged per person with 'mean_top_n'
+            snapshot_dir: Directory for the local gallery snapshot used for fast warm starts
+                          (None = always download the full gallery)
+            gallery_sync_interval: Seconds between background checks for new, updated or
+                                   deleted reports (None = only sync on 'r')
+            pipeline_queue_size: Frames buffered between the capture, inference and render
+                                 stages of run(); inference always works on the latest
+                                 frame, larger values only buffer more frames for display
+            reembed_interval: Frames between re-embeddings of a tracked face that is already
+                              identified (it is re-embedded sooner if the face changes)
+            unknown_reembed_interval: Frames between re-embeddings of a tracked face that is not
+                                      identified, e.g. a stranger in a crowd (same early triggers)
+            alert_transport: AlertTransport used to deliver alerts instead of Sinch SMS
+                             (e.g. FakeTransport() for testing without sending messages)
+            alert_queue_path: JSON file holding alerts that have not been delivered yet
+            camera_location: Fixed location reported in alerts, as {'latitude', 'longitude',
+                             'address'} for all cameras or {camera index: location} per camera
+                             (None = GPS or IP geolocation)
+            gps_port: Serial port of an NMEA GPS receiver (e.g. '/dev/ttyUSB0'), used
+                      when no fixed location is configured
+            location_ttl: Seconds an IP geolocation result is reused before it is refreshed
+            evidence_jpeg_quality: JPEG quality (0-100) of saved detection images
+            evidence_queue_size: Detections waiting to be saved before evidence_drop_policy applies
+            evidence_drop_policy: 'drop_newest' (retry the save on a later frame), 'drop_oldest'
+                                  or 'block' (wait briefly) when saving falls behind
+            state_path: SQLite file keeping SMS cooldowns and saved-person markers across
+                        restarts (None = forget them when the detector exits)
+            motion_gating: Run face detection only where the picture changed (and on tracked
+                           faces that need recognition); frames without motion skip detection
+            camera_rois: Region of interest per camera, as {camera index: roi} ('*' = all other
+                         cameras); an roi is a box (x1, y1, x2, y2) or a list of boxes and polygons
+                         [(x, y), ...] in 0-1 frame coordinates. Faces whose box centre is outside
+                         it are ignored (detection itself runs on the ROI's bounding box)
+            motion_threshold: Brightness change (0-255) of a pixel that counts as motion
+            motion_refresh_interval: Seconds between full detections while motion gating, so
+                                     people standing still are still found
+            adaptive_quality: Lower process_resolution, detection_size and the detection rate
+                              at runtime when latency exceeds target_latency or the device
+                              reaches thermal_limit, and restore them when there is headroom
+                              (the constructor values are the highest quality used)
+            target_latency: Capture-to-decision latency budget in seconds for adaptive_quality
+            thermal_limit: Temperature (deg C, from /sys/class/thermal) at which adaptive_quality
+                           lowers quality regardless of latency (None = ignore temperature)
+            thermal_zone_types: Thermal zone types (/sys/class/thermal/thermal_zone*/type) whose
+                                temperatures count, by default the CPU/GPU/SoC sensors (None = all
+                                zones, except ones known to read constant values like PMIC-Die)
         """
         self.similarity_threshold = similarity_threshold
         self.voice_similarity_threshold = voice_similarity_threshold
         self.smoothing_frames = smoothing_frames
-        self.similarity_history = deque(maxlen=smoothing_frames)
         self.save_outputs = save_outputs
         self.frame_skip = frame_skip
         self.process_resolution = process_resolution
         self.detection_size = detection_size
+        self.base_frame_skip = frame_skip
+        self.match_top_k = max(1, match_top_k)
+        self.gallery_index_kind = gallery_index
+        self.gallery_nprobe = gallery_nprobe
+        self.face_aggregation = face_aggregation
+        self.face_aggregation_top_n = face_aggregation_top_n
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
         self.enable_voice = enable_voice
         self.voice_chunk_duration = voice_chunk_duration
+        self.voice_hop_duration = voice_hop_duration
+        self.voice_vad_aggressiveness = voice_vad_aggressiveness
+        self.voice_max_matches = voice_max_matches
         
-        # Initialize InsightFace
+        # Initialize InsightFace (only detection + recognition unless more modules are requested)
         providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if use_gpu else ['CPUExecutionProvider']
-        self.app = insightface.app.FaceAnalysis(name='buffalo_l', providers=providers)
+        self.face_modules = list(REQUIRED_FACE_MODULES) + [m for m in (face_modules or []) if m not in REQUIRED_FACE_MODULES]
+        self.app = insightface.app.FaceAnalysis(name='buffalo_l', allowed_modules=self.face_modules,
+                                                providers=providers)
         self.app.prepare(ctx_id=-1 if use_gpu else 0, det_size=(detection_size, detection_size))
         
         # Initialize Voice Encoder
@@ -85,6 +183,8 @@ class FirebaseFaceDetector:
             self.voice_match_history = {}  # Track matches over time: {name: {'similarity': float, 'count': int, 'last_seen': time, 'first_detected': time}}
             self.active_speakers = {}  # Track currently active speakers: {name: {'similarity': float, 'last_update': time}}
             self.speaker_timeout = 2.0  # Remove speaker after 2 seconds of no detection (faster for crowded places)
+            self.voice_windows_silent = 0  # Windows skipped by voice activity detection
+            self.voice_windows_skipped = 0  # Windows skipped because the encoder fell behind
         
         # Setup output directories if needed
         if self.save_outputs:
@@ -98,45 +198,79 @@ class FirebaseFaceDetector:
         # Initialize Firebase
         self.db = self.initialize_firebase()
         
-        # Download and load embeddings from Firebase (only once at startup)
+        # Load embeddings: local snapshot plus changes from Firebase (only once at startup)
         print("\n" + "="*60)
-        print("📥 DOWNLOADING EMBEDDINGS FROM FIREBASE...")
+        print("📥 LOADING EMBEDDINGS...")
         print("="*60)
-        self.reference_embeddings, self.reference_names, self.reference_info, \
-        self.voice_embeddings, self.voice_names, self.voice_info = self.download_embeddings_from_firebase()
-        self.reference_embeddings_array = np.array(self.reference_embeddings) if len(self.reference_embeddings) > 0 else None
-        self.voice_embeddings_array = np.array(self.voice_embeddings) if len(self.voice_embeddings) > 0 else None
+        self.apply_gallery(self.load_gallery())
         
-        print(f"✅ Loaded {len(self.reference_embeddings)} face embeddings into memory")
+        print(f"✅ Loaded {self.gallery.face_embedding_count} face embeddings of "
+              f"{self.gallery.face_count} people into memory")
+        if self.gallery.face_index is not None:
+            print(f"🔎 Face gallery index: {self.gallery.face_index.kind}")
         if self.enable_voice:
-            print(f"✅ Loaded {len(self.voice_embeddings)} voice embeddings into memory")
+            print(f"✅ Loaded {self.gallery.voice_count} voice embeddings into memory")
         print("✅ All matching will now use local embeddings (no Firebase queries during detection)")
         print("="*60 + "\n")
         
+        # Background sync keeps the gallery current without blocking the frame loop
+        self.gallery_sync_interval = gallery_sync_interval
+        self.gallery_sync = GallerySync(self, poll_interval=gallery_sync_interval)
+        
         self.frame_counter = 0
         self.fps_history = deque(maxlen=30)
         self.last_time = time.time()
         
+        # Threaded pipeline used by run(); per-camera smoothing, detection timers
+        # and statistics live in one StreamState per video stream
+        self.pipeline_queue_size = pipeline_queue_size
+        self.reembed_interval = reembed_interval
+        self.unknown_reembed_interval = unknown_reembed_interval
+        self.motion_gating = motion_gating
+        # Camera indices as passed to run() map to stream IDs 'cam0', 'cam1', ...
+        self.camera_rois = {(f"cam{key}" if isinstance(key, int) else key): roi
+                            for key, roi in (camera_rois or {}).items()}
+        self.motion_threshold = motion_threshold
+        self.motion_refresh_interval = motion_refresh_interval
+        self.default_stream = self.create_stream_state("default")
+        
+        # Trades resolution, det_size and detection rate for latency under load or heat
+        self.governor = None
+        if adaptive_quality:
+            self.governor = PerformanceGovernor(process_resolution, detection_size, frame_skip,
+                                                target_latency=target_latency, thermal_limit=thermal_limit,
+                                                thermal_zone_types=thermal_zone_types)
+        self.stage_times = {}  # Durations of the stages of the latest detect_faces_batch() call
+        self.streams = {}
+        
         # Cache for smoother rendering
         self.last_faces_data = []  # Store last detected faces data
         self.frame_cache = None  # Cache last processed frame
         self.last_detection_time = 0
         
+        # Cooldowns and saved-person markers survive restarts; changes are written in the background
+        self.state_store = DetectionStateStore(state_path)
+        self.state_store.start()
+        
         # Tracking for continuous detection and image saving
-        self.detection_timers = {}  # Track when each person was first detected: {name: first_detection_time}
-        self.saved_persons = set()  # Track which persons have already been saved
+        self.saved_persons = set(self.state_store.saved_persons)  # Track which persons have already been saved
+        self.pending_saves = set()  # Persons whose evidence is queued but not written yet
         self.save_duration = 10.0  # Save after 10 seconds of continuous detection
         self.storage_dir = Path("detected_persons")
-        self.storage_dir.mkdir(exist_ok=True)
+        
+        # Images are encoded and written on the evidence writer's thread, not the frame loop
+        self.evidence_writer = EvidenceWriter(self.storage_dir, jpeg_quality=evidence_jpeg_quality,
+                                              queue_size=evidence_queue_size, drop_policy=evidence_drop_policy,
+                                              on_done=self.on_evidence_done)
+        self.evidence_writer.start()
         print(f"📁 Images will be saved to: {self.storage_dir.absolute()}")
         
         # SMS Configuration
         self.enable_sms = enable_sms
         self.sms_cooldown = 3600.0  # Don't send SMS for same person more than once per hour (3600 seconds)
-        self.sms_sent_times = {}  # Track when SMS was last sent for each person: {person_key: last_sms_time}
         
-        # Initialize Sinch Client if SMS is enabled
-        if self.enable_sms:
+        # Initialize Sinch Client if SMS is enabled (and no other transport was given)
+        if self.enable_sms and alert_transport is None:
             # Try to read from sinch_config.txt file if it exists
             sinch_config_file = Path("sinch_config.txt")
             if sinch_config_file.exists() and not (sinch_key_id or sinch_key_secret or sinch_project_id):
@@ -195,6 +329,18 @@ class FirebaseFaceDetector:
                 print("   2. Set environment variables: SINCH_KEY_ID, SINCH_KEY_SECRET, SINCH_PROJECT_ID, SINCH_FROM_NUMBER")
                 print("   3. Pass credentials directly as parameters to FirebaseFaceDetector()")
                 self.enable_sms = False
+        
+        # Camera location for alerts: fixed, GPS or cached IP geolocation (never looked up in the frame loop)
+        self.location_provider = LocationProvider(camera_locations=camera_location, gps_port=gps_port,
+                                                  ttl=location_ttl)
+        
+        # Alerts are delivered by a background dispatcher, so detection never waits on the network
+        self.alert_dispatcher = None
+        if self.enable_sms:
+            transport = alert_transport or SinchSmsTransport(self.sinch_client, self.sinch_from_number)
+            self.alert_dispatcher = AlertDispatcher(transport, cooldown=self.sms_cooldown,
+                                                    queue_path=alert_queue_path,
+                                                    state_store=self.state_store)
     
     def initialize_firebase(self):
         """Initialize Firebase Admin SDK."""
@@ -244,119 +390,153 @@ class FirebaseFaceDetector:
             print(f"❌ Error connecting to Firestore: {e}")
             raise
     
-    def download_embeddings_from_firebase(self):
+    def download_embeddings_from_firebase(self, updated_since=None, verbose=True):
         """
-        Download all face and voice embeddings from Firebase Firestore 'upload' collection.
-        This is done ONCE at startup - all subsequent matching uses local data.
+        Download face and voice embeddings from Firebase Firestore 'upload' collection.
+        This is done at startup - all subsequent matching uses local data.
+        
+        Args:
+            updated_since: Only download documents updated at or after this time (None = all)
+            verbose: Print progress for every document (disabled for background syncs)
         
         Returns:
-            face_embeddings: List of face embedding arrays
-            face_names: List of person names for faces
-            face_info: List of additional info for faces
-            voice_embeddings: List of voice embedding arrays
-            voice_names: List of person names for voices
-            voice_info: List of additional info for voices
+            documents: {doc_id: parsed document} (see gallery_snapshot.parse_upload_document),
+                       or None if the download failed
+            latest_update: Latest 'updatedAt' among the downloaded documents (None if unknown)
         """
-        face_embeddings = []
-        face_names = []
-        face_info = []
-        voice_embeddings = []
-        voice_names = []
-        voice_info = []
+        documents = {}
+        latest_update = None
         
         try:
-            print("📡 Connecting to Firebase Firestore...")
-            # Get all documents from 'upload' collection
-            uploads_ref = self.db.collection("upload")
+            if verbose:
+                print("📡 Connecting to Firebase Firestore...")
+            # Get documents from 'upload' collection (only changed ones if we have a snapshot),
+            # projecting to the gallery fields so image/audio blobs are never downloaded
+            uploads_ref = self.db.collection("upload").select(GALLERY_FIELDS)
+            if updated_since is not None:
+                uploads_ref = uploads_ref.where("updatedAt", ">=", updated_since)
             docs = uploads_ref.stream()
             
             total_docs = 0
             total_face_embeddings = 0
             total_voice_embeddings = 0
             
-            print("📥 Downloading documents...")
+            if verbose:
+                print("📥 Downloading documents...")
             for doc in docs:
                 total_docs += 1
                 doc_data = doc.to_dict()
                 
-                # Get person information
-                full_name = doc_data.get("fullName", "Unknown")
-                age = doc_data.get("age", "N/A")
-                city = doc_data.get("cityLastSeen", "N/A")
-                date_seen = doc_data.get("dateLastSeen", "N/A")
-                contact = doc_data.get("contactPhone", "N/A")
+                updated_at = doc_data.get("updatedAt")
+                if updated_at is not None and (latest_update is None or updated_at > latest_update):
+                    latest_update = updated_at
                 
-                # Extract face embeddings from imageMetadata
-                image_metadata = doc_data.get("imageMetadata", [])
+                document = parse_upload_document(doc_data, doc.id)
+                documents[doc.id] = document
+                full_name = document["person"]["name"]
                 
-                for img_meta in image_metadata:
-                    if img_meta.get("has_face", False) and img_meta.get("embedding") is not None:
-                        embedding = np.array(img_meta.get("embedding"))
-                        face_embeddings.append(embedding)
-                        face_names.append(full_name)
-                        face_info.append({
-                            "name": full_name,
-                            "age": age,
-                            "city": city,
-                            "dateSeen": date_seen,
-                            "contact": contact,
-                            "docId": doc.id,
-                            "imageIndex": img_meta.get("index", 0),
-                            "type": "face"
-                        })
-                        total_face_embeddings += 1
+                for _ in document["faces"]:
+                    total_face_embeddings += 1
+                    if verbose:
                         print(f"  ✓ Downloaded face embedding for: {full_name} (Doc #{total_docs}, Face #{total_face_embeddings})")
                 
-                # Extract voice embeddings from audioMetadata
-                audio_metadata = doc_data.get("audioMetadata")
-                if audio_metadata and audio_metadata.get("has_voice", False) and audio_metadata.get("embedding") is not None:
-                    voice_embedding = np.array(audio_metadata.get("embedding"))
-                    voice_embeddings.append(voice_embedding)
-                    voice_names.append(full_name)
-                    voice_info.append({
-                        "name": full_name,
-                        "age": age,
-                        "city": city,
-                        "dateSeen": date_seen,
-                        "contact": contact,
-                        "docId": doc.id,
-                        "type": "voice"
-                    })
+                if document["voice"] is not None:
                     total_voice_embeddings += 1
-                    print(f"  ✓ Downloaded voice embedding for: {full_name} (Doc #{total_docs}, Voice #{total_voice_embeddings})")
+                    if verbose:
+                        print(f"  ✓ Downloaded voice embedding for: {full_name} (Doc #{total_docs}, Voice #{total_voice_embeddings})")
             
-            print(f"\n✅ Download complete:")
-            print(f"   - {total_face_embeddings} face embeddings from {total_docs} documents")
-            if self.enable_voice:
-                print(f"   - {total_voice_embeddings} voice embeddings from {total_docs} documents")
+            if verbose:
+                print(f"\n✅ Download complete:")
+                print(f"   - {total_face_embeddings} face embeddings from {total_docs} documents")
+                if self.enable_voice:
+                    print(f"   - {total_voice_embeddings} voice embeddings from {total_docs} documents")
             
-            if len(face_embeddings) == 0 and len(voice_embeddings) == 0:
+            if updated_since is None and total_face_embeddings == 0 and total_voice_embeddings == 0:
                 print("⚠️  No embeddings found in Firebase. Make sure you have uploaded missing person data.")
             
-            return face_embeddings, face_names, face_info, voice_embeddings, voice_names, voice_info
+            return documents, latest_update
             
         except Exception as e:
             print(f"❌ Error downloading embeddings from Firebase: {e}")
-            return [], [], [], [], [], []
+            return None, None
+    
+    def load_gallery(self):
+        """
+        Load the gallery for startup: the local snapshot (if any) plus documents
+        changed in Firebase since it was taken. Falls back to a full download
+        when there is no usable snapshot, and to the snapshot alone when offline.
+        
+        Returns:
+            GallerySnapshot
+        """
+        snapshot = GallerySnapshot.load(self.snapshot_dir) if self.snapshot_dir else None
+        
+        if snapshot is None or snapshot.synced_at is None:
+            documents, latest_update = self.download_embeddings_from_firebase()
+            if documents is None:
+                return snapshot or GallerySnapshot.empty()
+            snapshot = GallerySnapshot.from_documents(documents, synced_at=latest_update)
+            self.save_gallery_snapshot(snapshot)
+            return snapshot
+        
+        print(f"💾 Loaded gallery snapshot: {len(snapshot.face_rows)} face / "
+              f"{len(snapshot.voice_rows)} voice embeddings (synced at {snapshot.synced_at})")
+        documents, latest_update = self.download_embeddings_from_firebase(updated_since=snapshot.synced_at)
+        if documents:
+            documents = snapshot.filter_changes(documents)
+        if documents:
+            snapshot = snapshot.merge(documents, synced_at=latest_update)
+            self.save_gallery_snapshot(snapshot)
+        elif documents is None:
+            print("⚠️  Using local gallery snapshot only (Firebase unavailable)")
+        return snapshot
+    
+    def save_gallery_snapshot(self, snapshot):
+        """Persist the gallery snapshot, if snapshots are enabled."""
+        if self.snapshot_dir is None:
+            return
+        try:
+            snapshot.save(self.snapshot_dir)
+            print(f"💾 Gallery snapshot saved to: {self.snapshot_dir.absolute()}")
+        except Exception as e:
+            print(f"⚠️  Could not save gallery snapshot: {e}")
+    
+    def apply_gallery(self, snapshot):
+        """
+        Make a gallery snapshot the one used for matching.
+        The new Gallery (including its index) is fully built before a single
+        reference assignment swaps it in, so readers never see a partial update.
+        The face index is updated from the current gallery's (trained IVF
+        centroids are kept), not rebuilt from scratch.
+        """
+        self.gallery = Gallery(snapshot, index_kind=self.gallery_index_kind, nprobe=self.gallery_nprobe,
+                               aggregation=self.face_aggregation, aggregation_top_n=self.face_aggregation_top_n,
+                               previous=getattr(self, 'gallery', None))
     
     def reload_embeddings_from_firebase(self):
         """
         Reload embeddings from Firebase (useful when new data is added).
-        This replaces the local embeddings with fresh data from Firebase.
+        This replaces the local embeddings (and snapshot) with fresh data from Firebase.
+        Blocking - the run loop requests this through the background gallery sync instead.
         """
         print("\n" + "="*60)
         print("🔄 RELOADING EMBEDDINGS FROM FIREBASE...")
         print("="*60)
-        self.reference_embeddings, self.reference_names, self.reference_info, \
-        self.voice_embeddings, self.voice_names, self.voice_info = self.download_embeddings_from_firebase()
-        self.reference_embeddings_array = np.array(self.reference_embeddings) if len(self.reference_embeddings) > 0 else None
-        self.voice_embeddings_array = np.array(self.voice_embeddings) if len(self.voice_embeddings) > 0 else None
-        print(f"✅ Reloaded {len(self.reference_embeddings)} face embeddings into memory")
+        documents, latest_update = self.download_embeddings_from_firebase()
+        if documents is None:
+            print("⚠️  Reload failed, keeping current embeddings")
+            print("="*60 + "\n")
+            return
+        snapshot = GallerySnapshot.from_documents(documents, synced_at=latest_update)
+        self.apply_gallery(snapshot)
+        self.save_gallery_snapshot(snapshot)
+        print(f"✅ Reloaded {self.gallery.face_embedding_count} face embeddings of "
+              f"{self.gallery.face_count} people into memory")
         if self.enable_voice:
-            print(f"✅ Reloaded {len(self.voice_embeddings)} voice embeddings into memory")
+            print(f"✅ Reloaded {self.gallery.voice_count} voice embeddings into memory")
         print("="*60 + "\n")
     
-    def compute_max_similarity_vectorized(self, embedding):
+    def compute_max_similarity_vectorized(self, embedding, gallery=None):
         """
         Compute cosine similarity between input embedding and all LOCAL reference embeddings.
         This uses ONLY the downloaded embeddings (no Firebase queries).
@@ -365,22 +545,61 @@ class FirebaseFaceDetector:
             similarity: Best match similarity score
             best_match_idx: Index of best match
         """
-        if self.reference_embeddings_array is None or len(self.reference_embeddings_array) == 0:
-            return 0.0, None
-        
-        embedding_norm = np.linalg.norm(embedding)
-        if embedding_norm == 0:
+        scores, indices = self.match_faces_batch(np.asarray(embedding)[np.newaxis, :], top_k=1, gallery=gallery)
+        if indices is None or indices[0, 0] < 0:
             return 0.0, None
+        return float(scores[0, 0]), int(indices[0, 0])
+    
+    def match_faces_batch(self, embeddings, top_k=None, gallery=None):
+        """
+        Match every face embedding of a frame against the LOCAL gallery in one matrix product.
         
-        # Compute cosine similarity using LOCAL embeddings only
-        similarities = np.dot(self.reference_embeddings_array, embedding) / (
-            np.linalg.norm(self.reference_embeddings_array, axis=1) * embedding_norm
-        )
+        Args:
+            embeddings: (N, D) array with one embedding per detected face
+            top_k: Candidates to return per face (defaults to match_top_k)
+            gallery: Gallery to match against (defaults to the current one)
+            
+        Returns:
+            scores: (N, k) per-person similarities, best first (None if the gallery is empty)
+            indices: (N, k) gallery face identities (see gallery.face_match_info); -1 for faces with a zero
+                     embedding or padding
+        """
+        gallery = gallery or self.gallery
+        if gallery.face_index is None:
+            return None, None
+        
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        valid = norms[:, 0] > 0
+        norms[~valid] = 1.0
+        queries = queries / norms
+        
+        # Gallery rows are already L2-normalized, so the index works on plain dot products;
+        # it aggregates the scores of each person's photos into one score per person
+        scores, indices = gallery.face_index.search(queries, top_k or self.match_top_k)
+        scores[~valid] = 0.0
+        indices[~valid] = -1
+        return scores, indices
+    
+    def build_match_candidates(self, gallery, scores, indices):
+        """
+        Turn one face's top-k gallery hits into per-person candidates for operator review.
         
-        best_match_idx = int(np.argmax(similarities))
-        return float(similarities[best_match_idx]), best_match_idx
+        Returns:
+            List of {'name', 'similarity', 'docId'} dicts, best first
+        """
+        candidates = []
+        for score, idx in zip(scores, indices):
+            if idx < 0:
+                continue
+            candidates.append({
+                'name': gallery.face_name(idx),
+                'similarity': float(score),
+                'docId': gallery.face_doc_id(idx)
+            })
+        return candidates
     
-    def compute_voice_similarity(self, voice_embedding):
+    def compute_voice_similarity(self, voice_embedding, gallery=None):
         """
         Compute cosine similarity between input voice embedding and all LOCAL voice embeddings.
         
@@ -388,191 +607,177 @@ class FirebaseFaceDetector:
             similarity: Best match similarity score
             best_match_idx: Index of best match
         """
-        if not self.enable_voice or self.voice_embeddings_array is None or len(self.voice_embeddings_array) == 0:
+        voice_index = (gallery or self.gallery).voice_index
+        if not self.enable_voice or voice_index is None:
             return 0.0, None
-        
-        embedding_norm = np.linalg.norm(voice_embedding)
-        if embedding_norm == 0:
-            return 0.0, None
-        
-        # Compute cosine similarity using LOCAL voice embeddings only
-        similarities = np.dot(self.voice_embeddings_array, voice_embedding) / (
-            np.linalg.norm(self.voice_embeddings_array, axis=1) * embedding_norm
-        )
-        
-        best_match_idx = int(np.argmax(similarities))
-        return float(similarities[best_match_idx]), best_match_idx
+        return voice_index.best(voice_embedding)
     
-    def compute_all_voice_matches(self, voice_embedding, threshold=None):
+    def compute_all_voice_matches(self, voice_embedding, threshold=None, gallery=None):
         """
-        Compute cosine similarity for ALL voice embeddings and return all matches above threshold.
-        This allows detecting multiple speakers.
+        Find ALL voice embeddings above threshold, so multiple speakers can be detected.
         
         Returns:
-            matches: List of tuples (similarity, index, name, info) for all matches above threshold
+            scores: Similarities of the matches, highest first
+            indices: Voice gallery rows of the matches (see gallery.voice_name / voice_match_info)
         """
-        if not self.enable_voice or self.voice_embeddings_array is None or len(self.voice_embeddings_array) == 0:
-            return []
+        voice_index = (gallery or self.gallery).voice_index
+        if not self.enable_voice or voice_index is None:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.intp)
         
         if threshold is None:
             threshold = self.voice_similarity_threshold
         
-        embedding_norm = np.linalg.norm(voice_embedding)
-        if embedding_norm == 0:
-            return []
-        
-        # Compute cosine similarity for ALL embeddings
-        similarities = np.dot(self.voice_embeddings_array, voice_embedding) / (
-            np.linalg.norm(self.voice_embeddings_array, axis=1) * embedding_norm
-        )
-        
-        # Find all matches above threshold
-        matches = []
-        for idx, similarity in enumerate(similarities):
-            if similarity > threshold:
-                matches.append({
-                    'similarity': float(similarity),
-                    'index': idx,
-                    'name': self.voice_names[idx],
-                    'info': self.voice_info[idx]
-                })
-        
-        # Sort by similarity (highest first)
-        matches.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        return matches
+        return voice_index.above(voice_embedding, threshold, max_results=self.voice_max_matches)
     
     def voice_listen_loop(self):
         """
         Real-time voice detection loop running in a separate thread.
+        
+        The microphone streams into a ring buffer continuously; every
+        voice_hop_duration seconds the newest voice_chunk_duration seconds are
+        embedded, so no audio is lost while the encoder runs. Windows without
+        speech skip the encoder.
         """
+        window = int(self.sample_rate * self.voice_chunk_duration)
+        hop = max(1, int(self.sample_rate * self.voice_hop_duration))
+        ring = AudioRingBuffer(window + 4 * max(hop, self.sample_rate))
+        vad = VoiceActivityDetector(self.sample_rate, aggressiveness=self.voice_vad_aggressiveness)
+        
         while self.listening:
             try:
-                # Record audio chunk
-                audio = sd.rec(int(self.sample_rate * self.voice_chunk_duration),
-                              samplerate=self.sample_rate, channels=1, dtype='float32')
-                sd.wait()
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                    temp_path = temp_file.name
-                    try:
-                        # Convert to int16 for WAV format
-                        audio_int16 = (audio * 32767).astype(np.int16)
-                        write(temp_path, self.sample_rate, audio_int16)
+                with sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                                    blocksize=min(hop, self.sample_rate // 10), callback=ring.callback):
+                    next_end = ring.written + window
+                    while self.listening:
+                        if not ring.wait_for(next_end, timeout=0.5, sample_rate=self.sample_rate):
+                            continue
                         
-                        # Preprocess and extract embedding
-                        wav = preprocess_wav(temp_path)
-                        live_embedding = self.voice_encoder.embed_utterance(wav)
+                        # If the encoder fell behind, jump to the newest window
+                        if ring.written - next_end >= hop:
+                            self.voice_windows_skipped += (ring.written - next_end) // hop
+                            next_end = ring.written
+                        audio = ring.read(next_end, window)
+                        next_end += hop
+                        if audio is None:
+                            continue
                         
-                        # Find ALL matches above threshold (not just the best one)
-                        all_matches = self.compute_all_voice_matches(live_embedding)
-                        
-                        # Update voice match history and active speakers
-                        current_time = time.time()
-                        detected_names = set()
-                        
-                        # Process all matches found in this chunk
-                        for match in all_matches:
-                            name = match['name']
-                            similarity = match['similarity']
-                            detected_names.add(name)
+                        gallery = self.gallery
+                        if vad.is_speech(audio):
+                            # Preprocess and extract embedding straight from the buffered samples
+                            wav = preprocess_wav(audio, source_sr=self.sample_rate)
+                            live_embedding = self.voice_encoder.embed_utterance(wav)
                             
-                            # Update active speakers (for real-time display)
-                            self.active_speakers[name] = {
-                                'similarity': similarity,
-                                'last_update': current_time,
-                                'info': match['info']
-                            }
-                            
-                            # Update or create history entry
-                            if name not in self.voice_match_history:
-                                self.voice_match_history[name] = {
-                                    'similarity': similarity,
-                                    'count': 1,
-                                    'last_seen': current_time,
-                                    'first_detected': current_time,
-                                    'info': match['info']
-                                }
-                            else:
-                                # Update with exponential moving average
-                                old_sim = self.voice_match_history[name]['similarity']
-                                new_sim = 0.7 * old_sim + 0.3 * similarity  # Smoothing
-                                self.voice_match_history[name]['similarity'] = new_sim
-                                self.voice_match_history[name]['count'] += 1
-                                self.voice_match_history[name]['last_seen'] = current_time
-                        
-                        # Remove active speakers that haven't been detected recently (faster timeout for crowded places)
-                        active_speakers_to_remove = [
-                            name for name, data in self.active_speakers.items()
-                            if (current_time - data['last_update']) > self.speaker_timeout
-                        ]
-                        for name in active_speakers_to_remove:
-                            del self.active_speakers[name]
-                        
-                        # Remove matches from history that haven't been seen recently
-                        history_timeout = 5.0  # Keep in history longer for context
-                        names_to_remove = [
-                            name for name, data in self.voice_match_history.items()
-                            if (current_time - data['last_seen']) > history_timeout and name not in detected_names
-                        ]
-                        for name in names_to_remove:
-                            del self.voice_match_history[name]
-                        
-                        # Update current voice matches list - prioritize active speakers
-                        # First, add active speakers (currently speaking)
-                        active_matches = [
-                            {
-                                'name': name,
-                                'similarity': data['similarity'],
-                                'info': data['info'],
-                                'is_active': True,
-                                'last_update': data['last_update']
-                            }
-                            for name, data in self.active_speakers.items()
-                            if data['similarity'] > self.voice_similarity_threshold
-                        ]
-                        
-                        # Then add recent matches from history (recently detected)
-                        recent_matches = [
-                            {
-                                'name': name,
-                                'similarity': data['similarity'],
-                                'info': data['info'],
-                                'is_active': False,
-                                'last_seen': data['last_seen']
-                            }
-                            for name, data in self.voice_match_history.items()
-                            if name not in self.active_speakers and 
-                               data['similarity'] > self.voice_similarity_threshold and
-                               (current_time - data['last_seen']) < 3.0  # Show recent matches within 3 seconds
-                        ]
+                            # Find ALL matches above threshold (not just the best one)
+                            scores, indices = self.compute_all_voice_matches(live_embedding, gallery=gallery)
+                        else:
+                            self.voice_windows_silent += 1
+                            scores, indices = [], []
                         
-                        # Combine and sort: active speakers first, then by similarity
-                        self.current_voice_matches = active_matches + recent_matches
-                        self.current_voice_matches.sort(key=lambda x: (not x.get('is_active', False), -x['similarity']))
-                            
-                    finally:
-                        # Clean up temporary file
-                        if os.path.exists(temp_path):
-                            try:
-                                os.unlink(temp_path)
-                            except:
-                                pass
-                
-                # No sleep - process continuously for real-time detection in crowded places
-                # The audio recording itself provides natural pacing
+                        self.update_voice_matches(scores, indices, gallery, time.time())
                 
             except Exception as e:
                 print(f"Error in voice detection: {e}")
                 time.sleep(1)
     
+    def update_voice_matches(self, scores, indices, gallery, current_time):
+        """
+        Update active speakers, match history and current_voice_matches with the matches of one window.
+        
+        Args:
+            scores: Similarities of the voice matches found in the window (empty for silence)
+            indices: Voice gallery rows of those matches
+            gallery: Gallery the rows refer to
+            current_time: Time the window was processed
+        """
+        detected_names = set()
+        
+        # Process all matches found in this chunk
+        for similarity, idx in zip(scores, indices):
+            name = gallery.voice_name(idx)
+            similarity = float(similarity)
+            info = gallery.voice_match_info(idx)
+            detected_names.add(name)
+            
+            # Update active speakers (for real-time display)
+            self.active_speakers[name] = {
+                'similarity': similarity,
+                'last_update': current_time,
+                'info': info
+            }
+            
+            # Update or create history entry
+            if name not in self.voice_match_history:
+                self.voice_match_history[name] = {
+                    'similarity': similarity,
+                    'count': 1,
+                    'last_seen': current_time,
+                    'first_detected': current_time,
+                    'info': info
+                }
+            else:
+                # Update with exponential moving average
+                old_sim = self.voice_match_history[name]['similarity']
+                new_sim = 0.7 * old_sim + 0.3 * similarity  # Smoothing
+                self.voice_match_history[name]['similarity'] = new_sim
+                self.voice_match_history[name]['count'] += 1
+                self.voice_match_history[name]['last_seen'] = current_time
+        
+        # Remove active speakers that haven't been detected recently (faster timeout for crowded places)
+        active_speakers_to_remove = [
+            name for name, data in self.active_speakers.items()
+            if (current_time - data['last_update']) > self.speaker_timeout
+        ]
+        for name in active_speakers_to_remove:
+            del self.active_speakers[name]
+        
+        # Remove matches from history that haven't been seen recently
+        history_timeout = 5.0  # Keep in history longer for context
+        names_to_remove = [
+            name for name, data in self.voice_match_history.items()
+            if (current_time - data['last_seen']) > history_timeout and name not in detected_names
+        ]
+        for name in names_to_remove:
+            del self.voice_match_history[name]
+        
+        # Update current voice matches list - prioritize active speakers
+        # First, add active speakers (currently speaking)
+        active_matches = [
+            {
+                'name': name,
+                'similarity': data['similarity'],
+                'info': data['info'],
+                'is_active': True,
+                'last_update': data['last_update']
+            }
+            for name, data in self.active_speakers.items()
+            if data['similarity'] > self.voice_similarity_threshold
+        ]
+        
+        # Then add recent matches from history (recently detected)
+        recent_matches = [
+            {
+                'name': name,
+                'similarity': data['similarity'],
+                'info': data['info'],
+                'is_active': False,
+                'last_seen': data['last_seen']
+            }
+            for name, data in self.voice_match_history.items()
+            if name not in self.active_speakers and 
+               data['similarity'] > self.voice_similarity_threshold and
+               (current_time - data['last_seen']) < 3.0  # Show recent matches within 3 seconds
+        ]
+        
+        # Combine and sort: active speakers first, then by similarity
+        self.current_voice_matches = active_matches + recent_matches
+        self.current_voice_matches.sort(key=lambda x: (not x.get('is_active', False), -x['similarity']))
+    
     def start_voice_detection(self):
         """Start voice detection in a separate thread."""
         if not self.enable_voice:
             return
         
-        if self.voice_embeddings_array is None or len(self.voice_embeddings_array) == 0:
+        if self.gallery.voice_index is None:
             print("⚠️  No voice embeddings loaded. Voice detection disabled.")
             return
         
@@ -588,162 +793,61 @@ class FirebaseFaceDetector:
             self.listening = False
             if self.voice_thread:
                 self.voice_thread.join(timeout=2)
-            print("🎤 Voice detection stopped")
+            print(f"🎤 Voice detection stopped ({self.voice_windows_silent} silent window(s) not embedded, "
+                  f"{self.voice_windows_skipped} skipped while busy)")
     
-    def save_detected_person_image(self, frame, person_key, name, match_info, x1, y1, x2, y2):
+    def save_detected_person_image(self, frame, person_key, name, match_info, x1, y1, x2, y2, stream_id=None):
         """
-        Save image of detected person after 10 seconds of continuous detection.
+        Queue the image of a detected person to be saved after 10 seconds of continuous detection.
+        
+        The crop, annotated full frame and a JSON record are written by the
+        evidence writer's thread.
         
         Args:
-            frame: Full frame from camera
+            frame: Full frame from camera (must not be modified afterwards)
             person_key: Unique key for the person
             name: Person's name
             match_info: Additional information about the person
             x1, y1, x2, y2: Bounding box coordinates
+            stream_id: Camera the person was detected on
+        
+        Returns:
+            True if the image was queued; False if the writer is falling behind
+            and the detection was dropped
         """
-        try:
-            # Extract person region with some padding
-            padding = 20
-            h, w = frame.shape[:2]
-            crop_x1 = max(0, x1 - padding)
-            crop_y1 = max(0, y1 - padding)
-            crop_x2 = min(w, x2 + padding)
-            crop_y2 = min(h, y2 + padding)
-            
-            # Crop the person from the frame
-            person_crop = frame[crop_y1:crop_y2, crop_x1:crop_x2]
-            
-            # Create filename with timestamp and person name
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).strip()
-            safe_name = safe_name.replace(' ', '_')
-            filename = f"{safe_name}_{timestamp}_{person_key[:8]}.jpg"
-            filepath = self.storage_dir / filename
-            
-            # Save the image
-            cv2.imwrite(str(filepath), person_crop)
-            
-            # Also save full frame with annotation
-            full_frame_filename = f"{safe_name}_{timestamp}_FULL.jpg"
-            full_frame_path = self.storage_dir / full_frame_filename
-            
-            # Draw annotation on full frame
-            annotated_frame = frame.copy()
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-            cv2.putText(annotated_frame, f"{name} - SAVED", (x1, y1 - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            cv2.imwrite(str(full_frame_path), annotated_frame)
-            
-            print(f"💾 SAVED: {name} - {filepath.name}")
-            print(f"💾 SAVED (Full Frame): {full_frame_filename}")
-            
-            # Create info file with person details
-            info_filename = f"{safe_name}_{timestamp}_INFO.txt"
-            info_path = self.storage_dir / info_filename
-            with open(info_path, 'w') as f:
-                f.write(f"Detected Person Information\n")
-                f.write(f"{'='*50}\n\n")
-                f.write(f"Name: {name}\n")
-                f.write(f"Age: {match_info.get('age', 'N/A')}\n")
-                f.write(f"City: {match_info.get('city', 'N/A')}\n")
-                f.write(f"Date Last Seen: {match_info.get('dateSeen', 'N/A')}\n")
-                f.write(f"Contact: {match_info.get('contact', 'N/A')}\n")
-                f.write(f"Document ID: {match_info.get('docId', 'N/A')}\n")
-                f.write(f"Detection Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Cropped Image: {filename}\n")
-                f.write(f"Full Frame: {full_frame_filename}\n")
-            
-            print(f"📄 Info saved: {info_filename}")
-            
-        except Exception as e:
-            print(f"❌ Error saving image for {name}: {e}")
+        if self.evidence_writer.submit(frame, (x1, y1, x2, y2), name, match_info, person_key, stream_id):
+            return True
+        print(f"⚠️  Evidence writer busy; will retry saving {name}")
+        return False
+    
+    def on_evidence_done(self, person_key, stream_id, saved):
+        """Evidence writer callback: mark the person saved once the images are written."""
+        if saved:
+            self.saved_persons.add(person_key)
+            self.state_store.record_saved(person_key, stream_id)
+        # A dropped or failed save is retried while the person is still in view
+        self.pending_saves.discard(person_key)
     
-    def get_smoothed_similarity(self, current_similarity):
-        """Apply temporal smoothing to similarity scores."""
-        self.similarity_history.append(current_similarity)
-        return np.mean(self.similarity_history)
+    def create_stream_state(self, stream_id):
+        """Create the tracking state (and motion gate, if enabled) for one video stream."""
+        roi = self.camera_rois.get(stream_id, self.camera_rois.get('*'))
+        motion_gate = None
+        if self.motion_gating or roi is not None:
+            motion_gate = MotionGate(roi=roi, motion=self.motion_gating, threshold=self.motion_threshold,
+                                     refresh_interval=self.motion_refresh_interval)
+        return StreamState(stream_id, self.smoothing_frames, self.reembed_interval, motion_gate=motion_gate,
+                           unknown_reembed_interval=self.unknown_reembed_interval)
     
-    def get_location_info(self):
+    def get_location_info(self, stream_id=None):
         """
-        Get current location coordinates and address information.
-        Uses IP-based geolocation as fallback if GPS is not available.
+        Get current location coordinates and address information for a camera.
+        Uses the configured fixed location, then GPS, then cached IP-based geolocation;
+        never waits on the network.
         
         Returns:
             dict: {'latitude': float, 'longitude': float, 'address': str, 'city': str, 'country': str}
         """
-        try:
-            # Try to get location from IP-based geolocation service
-            response = requests.get('http://ip-api.com/json/', timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'latitude': data.get('lat', 0.0),
-                    'longitude': data.get('lon', 0.0),
-                    'address': f"{data.get('city', 'Unknown')}, {data.get('regionName', 'Unknown')}",
-                    'city': data.get('city', 'Unknown'),
-                    'country': data.get('country', 'Unknown'),
-                    'zip': data.get('zip', 'Unknown')
-                }
-        except Exception as e:
-            print(f"⚠️  Could not get location from IP geolocation: {e}")
-        
-        # Fallback to default/unknown location
-        return {
-            'latitude': 0.0,
-            'longitude': 0.0,
-            'address': 'Location unavailable',
-            'city': 'Unknown',
-            'country': 'Unknown',
-            'zip': 'Unknown'
-        }
-    
-    def send_sms_notification(self, person_name, match_info, location_info):
-        """
-        Send SMS notification with person detection and location information.
-        
-        Args:
-            person_name: Name of the detected person
-            match_info: Additional information about the person
-            location_info: Location information dictionary
-        """
-        if not self.enable_sms:
-            print(f"⚠️  SMS is disabled. Cannot send SMS for {person_name}.")
-            return False
-        
-        if not hasattr(self, 'sinch_client') or self.sinch_client is None:
-            print(f"❌ Sinch client not initialized. Cannot send SMS for {person_name}.")
-            return False
-        
-        # Get contact number from match_info
-        contact_number = match_info.get('contact', '').strip()
-        if not contact_number:
-            print(f"⚠️  No contact number found for {person_name}. Cannot send SMS.")
-            return False
-        
-        # Format phone number (ensure it starts with +)
-        if not contact_number.startswith('+'):
-            # Assume it's a US number if no country code
-            if contact_number.startswith('1'):
-                contact_number = '+' + contact_number
-            else:
-                contact_number = '+1' + contact_number.replace('-', '').replace(' ', '').replace('(', '').replace(')', '')
-        
-        # Create SMS message with only name, age, and coordinates
-        message = f"{person_name}\n{match_info.get('age', 'N/A')}\n{location_info['latitude']:.6f},{location_info['longitude']:.6f}"
-
-        try:
-            send_batch_response = self.sinch_client.sms.batches.send(
-                body=message,
-                to=[contact_number],
-                from_=self.sinch_from_number,
-                delivery_report="none"
-            )
-            print(f"✅ SMS sent to {contact_number} for {person_name}")
-            print(f"   Response: {send_batch_response}")
-            return True
-        except Exception as e:
-            print(f"❌ Error sending SMS to {contact_number} for {person_name}: {e}")
-            return False
+        return self.location_provider.get_location(stream_id)
     
     def resize_for_processing(self, frame):
         """Resize frame for processing while maintaining aspect ratio."""
@@ -754,133 +858,283 @@ class FirebaseFaceDetector:
             return cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
         return frame
     
-    def process_frame(self, frame, frame_count=0):
+    def detect_in_region(self, image, region):
         """
-        Process a single frame for face detection and recognition.
-        Handles MULTIPLE faces in the frame with optimized performance.
+        Run the face detector on a region of an image.
+        
+        A cropped region gets a proportionally smaller detector input, so faces
+        are detected at the same scale as in a full-frame detection while the
+        detector processes fewer pixels.
+        
+        Args:
+            image: Image to detect in (already resized for processing)
+            region: Normalized (x1, y1, x2, y2) region (FULL_REGION = whole image)
         
         Returns:
-            frame: Processed frame with bounding boxes and labels for all faces
+            (bboxes, kpss) in image coordinates, as returned by the detection model
         """
-        self.frame_counter += 1
-        current_time = time.time()
-        
-        # Always update FPS for smooth display
-        fps = 1.0 / (current_time - self.last_time) if self.last_time > 0 else 0
-        self.fps_history.append(fps)
-        self.last_time = current_time
-        avg_fps = np.mean(self.fps_history) if len(self.fps_history) > 0 else 0
+        det_model = self.app.det_model
+        if region == FULL_REGION:
+            return det_model.detect(image, input_size=(self.detection_size, self.detection_size),
+                                    max_num=0, metric='default')
+        
+        h, w = image.shape[:2]
+        x1, y1 = int(region[0] * w), int(region[1] * h)
+        x2, y2 = int(np.ceil(region[2] * w)), int(np.ceil(region[3] * h))
+        crop = image[y1:y2, x1:x2]
+        
+        # Full-frame scale of the detector, with input sides rounded up to its stride of 32
+        scale = self.detection_size / max(h, w)
+        input_size = tuple(max(32, int(np.ceil(side * scale / 32)) * 32) for side in (x2 - x1, y2 - y1))
+        bboxes, kpss = det_model.detect(crop, input_size=input_size, max_num=0, metric='default')
+        
+        bboxes[:, :4] += np.array([x1, y1, x1, y1], dtype=bboxes.dtype)
+        if kpss is not None:
+            kpss += np.array([x1, y1], dtype=kpss.dtype)
+        return bboxes, kpss
+    
+    def apply_governor(self, latency, now):
+        """Record an inference latency and apply the governor's settings if they changed."""
+        if self.governor is None:
+            return
+        self.governor.record(latency, self.stage_times)
+        if not self.governor.update(now):
+            return
+        self.process_resolution, self.detection_size, self.frame_skip = self.governor.settings
+        temperature = f", SoC {self.governor.temperature:.0f}°C" if self.governor.temperature is not None else ""
+        print(f"🎚️  Quality level {self.governor.level}: {self.process_resolution}p, det_size "
+              f"{self.detection_size}, frame_skip {self.frame_skip}{temperature}")
+    
+    def detect_faces_batch(self, frames, streams=None, frame_skip=0):
+        """
+        Detect, track and match every face in a batch of frames (e.g. one per camera).
         
-        # Create a copy of frame for drawing (prevents flickering)
-        display_frame = frame.copy()
+        Faces are detected per frame and associated with the stream's face
+        tracks. With a motion gate, detection only runs on the part of the frame
+        that changed (or is skipped, keeping the current tracks). Faces that need recognition (new, unidentified or changed
+        tracks) are aligned and embedded in one recognition call and matched
+        against the gallery in one batched search; stable, identified tracks
+        keep their identity without being re-embedded.
         
-        # Decide whether to run detection or use cached results
-        should_detect = (self.frame_counter % (self.frame_skip + 1) == 0) or \
-                        (current_time - self.last_detection_time > 0.1)  # Force detection every 100ms
+        Args:
+            frames: List of BGR frames
+            streams: StreamState of each frame (defaults to the default stream)
+            frame_skip: Run detection on only one of every frame_skip + 1 calls per
+                        stream; the other calls keep the stream's current tracks
         
-        if should_detect:
+        Returns:
+            One list of face data dicts per frame (bbox in frame coordinates, track_id,
+            name, similarity, match_info, is_match, candidates)
+        """
+        if streams is None:
+            streams = [self.default_stream] * len(frames)
+        recognition = self.app.models['recognition']
+        
+        tracks_per_frame = []
+        crops = []
+        crop_tracks = []
+        detection_time = 0.0
+        for frame, stream in zip(frames, streams):
+            if stream.frames_until_detection > 0:
+                stream.frames_until_detection -= 1
+                tracks_per_frame.append(stream.tracker.visible_tracks())
+                continue
+            stream.frames_until_detection = frame_skip
+            
+            region = FULL_REGION
+            if stream.motion_gate is not None:
+                # Tracked faces that still need recognition are detected even if they hold still
+                visible = stream.tracker.visible_tracks()
+                refresh = [stream.tracker.needs_embedding(track, self.similarity_threshold) for track in visible]
+                region = stream.motion_gate.select_region(
+                    frame,
+                    refresh_boxes=[track.bbox for track, needed in zip(visible, refresh) if needed],
+                    track_boxes=[track.bbox for track, needed in zip(visible, refresh) if not needed],
+                    now=time.time())
+                if region is None:
+                    # Nothing moved: the faces are where they were
+                    tracks_per_frame.append(visible)
+                    continue
+            
             # Resize for processing (smaller = faster)
             processed_frame = self.resize_for_processing(frame)
-            faces = self.app.get(processed_frame)
+            started = time.time()
+            bboxes, kpss = self.detect_in_region(processed_frame, region)
+            detection_time += time.time() - started
+            if kpss is None:
+                bboxes = bboxes[:0]
+            elif stream.motion_gate is not None and stream.motion_gate.roi_polygons is not None:
+                # Detection ran on the ROI's bounding box; keep only faces inside the ROI itself
+                inside = stream.motion_gate.in_roi(bboxes, processed_frame.shape[1], processed_frame.shape[0])
+                bboxes, kpss = bboxes[inside], kpss[inside]
             
-            # Calculate scale factors for bounding box
+            # Scale bounding boxes back to original frame size
             scale_x = frame.shape[1] / processed_frame.shape[1]
             scale_y = frame.shape[0] / processed_frame.shape[0]
+            frame_bboxes = bboxes[:, :4] * np.array([scale_x, scale_y, scale_x, scale_y])
             
-            # Store faces data for caching
-            self.last_faces_data = []
+            tracks = stream.tracker.update(frame_bboxes, bboxes[:, 4])
+            tracks_per_frame.append(tracks)
             
-            if len(faces) > 0:
-                # Process ALL detected faces
-                for face_idx, face in enumerate(faces):
-                    embedding = face.embedding
-                    
-                    # Find best match for this face
-                    similarity, best_match_idx = self.compute_max_similarity_vectorized(embedding)
-                    smoothed_similarity = self.get_smoothed_similarity(similarity)
-                    
-                    # Determine name and match status
-                    name = "Unknown"
-                    match_info = None
-                    
-                    if best_match_idx is not None and smoothed_similarity > self.similarity_threshold:
-                        name = self.reference_names[best_match_idx]
-                        match_info = self.reference_info[best_match_idx]
-                    
-                    # Scale bounding box back to original frame size
-                    bbox = (face.bbox * np.array([scale_x, scale_y, scale_x, scale_y])).astype(int)
-                    x1, y1, x2, y2 = bbox
-                    
-                    # Store face data for caching
-                    self.last_faces_data.append({
-                        'bbox': (x1, y1, x2, y2),
-                        'name': name,
-                        'similarity': smoothed_similarity,
-                        'match_info': match_info,
-                        'is_match': name != "Unknown"
-                    })
+            for track, kps in zip(tracks, kpss if kpss is not None else []):
+                if stream.tracker.needs_embedding(track, self.similarity_threshold):
+                    crops.append(face_align.norm_crop(processed_frame, landmark=kps,
+                                                      image_size=recognition.input_size[0]))
+                    crop_tracks.append(track)
+        
+        if crops:
+            # One recognition pass and one gallery search for every face that needs it
+            # (grab the gallery once so a background sync cannot swap it mid-batch)
+            gallery = self.gallery
+            started = time.time()
+            embeddings = recognition.get_feat(crops)
+            recognition_time = time.time() - started
+            top_scores, top_indices = self.match_faces_batch(embeddings, gallery=gallery)
+            self.stage_times = {'detect': detection_time, 'recognize': recognition_time,
+                                'match': time.time() - started - recognition_time}
             
-            self.last_detection_time = current_time
+            for face_idx, track in enumerate(crop_tracks):
+                candidates = []
+                infos = {}
+                if top_indices is not None:
+                    candidates = self.build_match_candidates(gallery, top_scores[face_idx], top_indices[face_idx])
+                    # Info dicts are only built for the people among the candidates
+                    for idx in top_indices[face_idx]:
+                        if idx >= 0:
+                            infos[gallery.face_doc_id(idx)] = gallery.face_match_info(idx)
+                track.observe(candidates, infos)
+        else:
+            self.stage_times = {'detect': detection_time}
+        
+        faces_per_frame = []
+        for tracks in tracks_per_frame:
+            faces_data = []
+            for track in tracks:
+                # Determine name and match status from the track's identity vote
+                name = "Unknown"
+                match_info = None
+                if track.identity is not None and track.similarity > self.similarity_threshold:
+                    match_info = track.match_info
+                    name = match_info['name']
+                
+                x1, y1, x2, y2 = track.bbox.astype(int)
+                faces_data.append({
+                    'bbox': (x1, y1, x2, y2),
+                    'track_id': track.track_id,
+                    'name': name,
+                    'similarity': track.similarity,
+                    'match_info': match_info,
+                    'is_match': name != "Unknown",
+                    'candidates': track.candidates
+                })
+            faces_per_frame.append(faces_data)
+        
+        return faces_per_frame
+    
+    def detect_faces(self, frame, stream=None):
+        """
+        Detect and match every face in a frame.
+        
+        Returns:
+            List of face data dicts (see detect_faces_batch)
+        """
+        return self.detect_faces_batch([frame], [stream or self.default_stream])[0]
+    
+    def update_detections(self, frame, faces_data, current_time, stream=None):
+        """
+        Track continuously detected persons: send an SMS on first detection and
+        save an image after save_duration seconds.
+        
+        Adds 'tracked_for' (seconds) and 'saved' to the data of every matched face.
+        Detection timers are per stream; SMS cooldowns and saved persons are
+        shared by all streams.
+        
+        Args:
+            frame: Frame the faces were detected in
+            faces_data: Output of detect_faces()
+            current_time: Time of the detection (time.time())
+            stream: StreamState of the frame (defaults to the default stream)
+        """
+        detection_timers = (stream or self.default_stream).detection_timers
         
         # Track currently detected persons
         current_detected_names = set()
         
-        # Draw cached or current faces data
-        for face_data in self.last_faces_data:
+        for face_data in faces_data:
+            if not face_data['is_match']:
+                continue
+            
             x1, y1, x2, y2 = face_data['bbox']
             name = face_data['name']
-            similarity = face_data['similarity']
             match_info = face_data['match_info']
-            is_match = face_data['is_match']
+            person_key = f"{name}_{match_info.get('docId', 'unknown')}"
+            current_detected_names.add(person_key)
             
-            # Track detected persons for continuous detection
-            if is_match and name != "Unknown":
-                person_key = f"{name}_{match_info.get('docId', 'unknown')}"
-                current_detected_names.add(person_key)
+            # Start or continue tracking detection time
+            is_new_detection = person_key not in detection_timers
+            if is_new_detection:
+                detection_timers[person_key] = {
+                    'first_detection': current_time,
+                    'name': name,
+                    'info': match_info
+                }
+                print(f"⏱️  Started tracking: {name}")
                 
-                # Start or continue tracking detection time
-                is_new_detection = person_key not in self.detection_timers
-                if is_new_detection:
-                    self.detection_timers[person_key] = {
-                        'first_detection': current_time,
-                        'name': name,
-                        'info': match_info
-                    }
-                    print(f"⏱️  Started tracking: {name}")
-                    
-                    # Send SMS immediately when person is first detected (if cooldown allows)
-                    if self.enable_sms:
-                        last_sms_time = self.sms_sent_times.get(person_key, 0)
-                        time_since_last_sms = current_time - last_sms_time
-                        
-                        print(f"🔍 SMS check for {name}: last_sms_time={last_sms_time}, time_since={time_since_last_sms:.1f}s, cooldown={self.sms_cooldown}s")
-                        
-                        # Check if we can send SMS (either never sent, or cooldown expired)
-                        if time_since_last_sms >= self.sms_cooldown or last_sms_time == 0:
-                            print(f"✅ SMS cooldown passed or never sent. Getting location and sending SMS for {name}...")
-                            # Get current location
-                            location_info = self.get_location_info()
-                            
-                            # Send SMS notification
-                            if self.send_sms_notification(name, match_info, location_info):
-                                # Update last SMS time
-                                self.sms_sent_times[person_key] = current_time
-                                print(f"📱 SMS sent successfully for {name} at {location_info['address']}")
-                            else:
-                                print(f"❌ Failed to send SMS for {name}")
-                        else:
-                            remaining_cooldown = (self.sms_cooldown - time_since_last_sms) / 60
-                            print(f"⏳ SMS cooldown active for {name}. Next SMS available in {remaining_cooldown:.1f} minutes")
+                # Queue an SMS alert when person is first detected (if cooldown allows);
+                # delivery and location lookup happen on the alert dispatcher's thread
+                if self.alert_dispatcher is not None:
+                    location_info = self.get_location_info(stream.stream_id if stream else None)
+                    if self.alert_dispatcher.try_enqueue(person_key, name, match_info, location_info):
+                        print(f"📨 Alert queued for {name}")
                     else:
-                        print(f"⚠️  SMS is disabled. Enable SMS to send notifications for {name}")
-                
-                # Check if 10 seconds have passed (for image saving)
-                detection_duration = current_time - self.detection_timers[person_key]['first_detection']
-                
-                if detection_duration >= self.save_duration and person_key not in self.saved_persons:
-                    # Save the image
-                    self.save_detected_person_image(display_frame, person_key, name, match_info, x1, y1, x2, y2)
-                    self.saved_persons.add(person_key)
+                        remaining_cooldown = self.alert_dispatcher.cooldown_remaining(person_key) / 60
+                        print(f"⏳ SMS cooldown active for {name}. Next SMS available in {remaining_cooldown:.1f} minutes")
+                else:
+                    print(f"⚠️  SMS is disabled. Enable SMS to send notifications for {name}")
+            
+            # Check if 10 seconds have passed (for image saving)
+            detection_duration = current_time - detection_timers[person_key]['first_detection']
+            
+            if detection_duration >= self.save_duration and person_key not in self.saved_persons and \
+               person_key not in self.pending_saves:
+                # Queue the image; if the writer is falling behind, try again on a later frame.
+                # The person counts as saved only once the writer reports the files written
+                self.pending_saves.add(person_key)
+                if not self.save_detected_person_image(frame, person_key, name, match_info, x1, y1, x2, y2,
+                                                       stream.stream_id if stream else None):
+                    self.pending_saves.discard(person_key)
+            
+            face_data['tracked_for'] = detection_duration
+            face_data['saved'] = person_key in self.saved_persons
+        
+        # Remove timers for persons no longer detected
+        persons_to_remove = [key for key in detection_timers.keys() if key not in current_detected_names]
+        for key in persons_to_remove:
+            del detection_timers[key]
+            # Don't remove from saved_persons to prevent re-saving (they are also kept in the state store)
+            # SMS cooldowns are kept by the alert dispatcher
+    
+    def draw_frame(self, frame, faces_data, status_lines):
+        """
+        Draw face boxes, labels and the status panel on a copy of frame.
+        
+        Args:
+            frame: Frame to draw on (not modified)
+            faces_data: Face data from detect_faces()/update_detections()
+            status_lines: List of (text, color) shown at the top of the status panel
+        
+        Returns:
+            Annotated copy of frame
+        """
+        # Create a copy of frame for drawing (prevents flickering)
+        display_frame = frame.copy()
+        
+        for face_data in faces_data:
+            x1, y1, x2, y2 = face_data['bbox']
+            name = face_data['name']
+            similarity = face_data['similarity']
+            match_info = face_data['match_info']
+            is_match = face_data['is_match']
             
             # Determine color and label
             color = (0, 255, 0) if is_match else (0, 0, 255)
@@ -898,18 +1152,15 @@ class FirebaseFaceDetector:
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
             
             # Draw detection timer if person is being tracked
-            if is_match and name != "Unknown":
-                person_key = f"{name}_{match_info.get('docId', 'unknown')}"
-                if person_key in self.detection_timers:
-                    detection_duration = current_time - self.detection_timers[person_key]['first_detection']
-                    timer_text = f"Detected: {detection_duration:.1f}s"
-                    if person_key in self.saved_persons:
-                        timer_text = "✓ SAVED"
-                    (timer_width, timer_height), _ = cv2.getTextSize(timer_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                    cv2.rectangle(display_frame, (x1, y2 + 5), 
-                                 (x1 + timer_width + 10, y2 + timer_height + 10), (0, 255, 255), -1)
-                    cv2.putText(display_frame, timer_text, (x1 + 5, y2 + timer_height + 5),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+            if is_match and 'tracked_for' in face_data:
+                timer_text = f"Detected: {face_data['tracked_for']:.1f}s"
+                if face_data.get('saved'):
+                    timer_text = "✓ SAVED"
+                (timer_width, timer_height), _ = cv2.getTextSize(timer_text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+                cv2.rectangle(display_frame, (x1, y2 + 5), 
+                             (x1 + timer_width + 10, y2 + timer_height + 10), (0, 255, 255), -1)
+                cv2.putText(display_frame, timer_text, (x1 + 5, y2 + timer_height + 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
             
             # Draw additional info if match found
             if is_match and match_info:
@@ -926,44 +1177,42 @@ class FirebaseFaceDetector:
                              (x1 + contact_width, y2 + 60), color, -1)
                 cv2.putText(display_frame, contact_text, (x1, y2 + 55),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                
+                # Show runner-up candidates so operators can review close calls
+                runner_ups = face_data.get('candidates', [])[1:]
+                if runner_ups:
+                    runner_up_text = "Also: " + ", ".join(
+                        f"{c['name']} ({c['similarity']:.2f})" for c in runner_ups
+                    )
+                    cv2.putText(display_frame, runner_up_text, (x1, y2 + 80),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
         
-        # Remove timers for persons no longer detected
-        persons_to_remove = [key for key in self.detection_timers.keys() if key not in current_detected_names]
-        for key in persons_to_remove:
-            del self.detection_timers[key]
-            # Don't remove from saved_persons to prevent re-saving
-            # Don't remove from sms_sent_times to maintain cooldown tracking
-        
-        # Display FPS and face count with background for readability
-        fps_text = f"FPS: {avg_fps:.1f}"
-        faces_text = f"Faces: {len(self.last_faces_data)}"
-        
-        # Calculate dynamic info height based on number of voices
-        info_height = 80
+        # Calculate dynamic info height based on number of status lines and voices
+        voice_y = 30 * len(status_lines) + 30
+        info_height = voice_y - 10
         if self.enable_voice:
             if len(self.current_voice_matches) > 0:
                 max_voices_to_show = min(5, len(self.current_voice_matches))
-                info_height = 80 + (max_voices_to_show * 25) + 10  # Extra space for "more" indicator
-                if info_height > 220:
-                    info_height = 220  # Max height
+                info_height = voice_y - 10 + (max_voices_to_show * 25) + 10  # Extra space for "more" indicator
+                info_height = min(info_height, voice_y + 130)  # Max height
             else:
-                info_height = 110
+                info_height = voice_y + 20
         
         # Draw background rectangles for text
         cv2.rectangle(display_frame, (5, 5), (350, info_height), (0, 0, 0), -1)
-        cv2.putText(display_frame, fps_text, (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        cv2.putText(display_frame, faces_text, (10, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        for line_idx, (text, color) in enumerate(status_lines):
+            cv2.putText(display_frame, text, (10, 30 + 30 * line_idx),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
         
         # Display voice matches (can be multiple speakers) - optimized for crowded places
         if self.enable_voice:
-            if len(self.current_voice_matches) > 0:
+            voice_matches = self.current_voice_matches
+            if len(voice_matches) > 0:
                 # Display all detected voices
-                y_offset = 90
-                max_voices_to_show = min(5, len(self.current_voice_matches))  # Show up to 5 speakers in crowded places
+                y_offset = voice_y
+                max_voices_to_show = min(5, len(voice_matches))  # Show up to 5 speakers in crowded places
                 
-                for i, match in enumerate(self.current_voice_matches[:max_voices_to_show]):
+                for i, match in enumerate(voice_matches[:max_voices_to_show]):
                     is_active = match.get('is_active', False)
                     
                     # Different colors for active vs recent speakers
@@ -981,44 +1230,169 @@ class FirebaseFaceDetector:
                     y_offset += 25
                 
                 # Show count if more speakers detected
-                if len(self.current_voice_matches) > max_voices_to_show:
-                    more_text = f"... +{len(self.current_voice_matches) - max_voices_to_show} more"
+                if len(voice_matches) > max_voices_to_show:
+                    more_text = f"... +{len(voice_matches) - max_voices_to_show} more"
                     cv2.putText(display_frame, more_text, (10, y_offset),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 128, 128), 1)
             else:
-                cv2.putText(display_frame, "Voice: Listening...", (10, 90),
+                cv2.putText(display_frame, "Voice: Listening...", (10, voice_y),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.7, (128, 128, 128), 2)
         
         return display_frame
     
+    def process_frame(self, frame, frame_count=0):
+        """
+        Process a single frame for face detection and recognition.
+        Handles MULTIPLE faces in the frame with optimized performance.
+        
+        Runs detection, tracking and drawing serially on the calling thread;
+        run() uses the threaded pipeline instead.
+        
+        Returns:
+            frame: Processed frame with bounding boxes and labels for all faces
+        """
+        self.frame_counter += 1
+        current_time = time.time()
+        
+        # Always update FPS for smooth display
+        fps = 1.0 / (current_time - self.last_time) if self.last_time > 0 else 0
+        self.fps_history.append(fps)
+        self.last_time = current_time
+        avg_fps = np.mean(self.fps_history) if len(self.fps_history) > 0 else 0
+        
+        # Decide whether to run detection or use cached results; the forced
+        # redetection interval (100ms at full quality) grows as the governor skips frames
+        redetect_interval = 0.1 * (1 + self.frame_skip - self.base_frame_skip)
+        should_detect = (self.frame_counter % (self.frame_skip + 1) == 0) or \
+                        (current_time - self.last_detection_time > redetect_interval)
+        
+        if should_detect:
+            # Store faces data for caching
+            self.last_faces_data = self.detect_faces(frame)
+            self.last_detection_time = current_time
+            self.apply_governor(time.time() - current_time, time.time())
+        
+        self.update_detections(frame, self.last_faces_data, current_time)
+        
+        # Display FPS and face count
+        status_lines = [
+            (f"FPS: {avg_fps:.1f}", (0, 255, 0)),
+            (f"Faces: {len(self.last_faces_data)}", (255, 255, 255)),
+        ]
+        return self.draw_frame(frame, self.last_faces_data, status_lines)
+    
+    def infer_frames(self, packets):
+        """Inference stage of the pipeline: detect, match and track the faces in the newest frame of each stream."""
+        streams = [self.streams[packet.stream_id] for packet in packets]
+        # run() normally detects on every frame it gets; the governor may skip some under load
+        faces_per_frame = self.detect_faces_batch([packet.frame for packet in packets], streams,
+                                                  frame_skip=max(0, self.frame_skip - self.base_frame_skip))
+        current_time = time.time()
+        # Frames are stamped with perf_counter() when captured
+        self.apply_governor(time.perf_counter() - min(packet.captured_at for packet in packets), current_time)
+        for packet, stream, faces_data in zip(packets, streams, faces_per_frame):
+            self.update_detections(packet.frame, faces_data, current_time, stream)
+        return faces_per_frame
+    
+    def open_video_source(self, video_source):
+        """
+        Open a camera index, video file or stream URL.
+        
+        Returns:
+            (cap, pace_fps) where pace_fps is the rate to read a video file at
+            (None for live sources), or (None, None) if the source cannot be opened
+        """
+        cap = cv2.VideoCapture(video_source)
+        if not cap.isOpened():
+            print(f"Could not open video source: {video_source}")
+            return None, None
+        
+        # Set camera properties for smoother video
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        cap.set(cv2.CAP_PROP_FPS, 30)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer for lower latency
+        
+        # Video files are read at their own frame rate; cameras and network streams deliver frames in real time
+        pace_fps = None
+        if isinstance(video_source, (str, Path)) and "://" not in str(video_source):
+            pace_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        return cap, pace_fps
+    
+    def handle_key(self, key):
+        """
+        Handle a key press in the detection window.
+        
+        Returns:
+            False if the user asked to quit
+        """
+        if key == ord('q'):
+            return False
+        elif key == ord('r'):
+            # Reload embeddings from Firebase without freezing the video feed
+            self.gallery_sync.request_full_sync()
+            # Restart voice detection if it was running
+            if self.enable_voice and not self.listening:
+                self.start_voice_detection()
+        elif key == ord('v'):
+            # Toggle voice detection
+            if self.enable_voice:
+                if self.listening:
+                    self.stop_voice_detection()
+                else:
+                    self.start_voice_detection()
+        return True
+    
     def run(self, video_source=0):
         """
-        Run face detection on video source.
+        Run face detection on one or more video sources.
+        
+        All sources share this detector's model and gallery; faces from the
+        newest frame of every source are embedded and matched in one batch.
         
         Args:
-            video_source: Video source (0 for webcam, or path to video file)
+            video_source: Video source (0 for webcam, path to video file, RTSP/HTTP
+                          URL), or a list of sources to watch several cameras at once
         """
-        if len(self.reference_embeddings) == 0:
+        if self.gallery.face_count == 0 and self.gallery_sync_interval is None:
             print("❌ No embeddings loaded from Firebase. Cannot run detection.")
             return
         
+        video_sources = list(video_source) if isinstance(video_source, (list, tuple)) else [video_source]
+        if len(video_sources) == 1:
+            window_names = {"cam0": 'Firebase Face & Voice Detection'}
+        else:
+            window_names = {f"cam{idx}": f'Firebase Face & Voice Detection - cam{idx}'
+                            for idx in range(len(video_sources))}
+        
         try:
-            cv2.namedWindow('Firebase Face & Voice Detection', cv2.WINDOW_NORMAL)
+            for window_name in window_names.values():
+                cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
         except cv2.error:
             print("GUI Error. Fix by reinstalling OpenCV.")
             return
         
-        cap = cv2.VideoCapture(video_source)
-        if not cap.isOpened():
-            print(f"Could not open video source: {video_source}")
-            return
+        streams = {}
+        sources = {}
+        for idx, source in enumerate(video_sources):
+            cap, pace_fps = self.open_video_source(source)
+            if cap is None:
+                for opened_cap, _ in streams.values():
+                    opened_cap.release()
+                cv2.destroyAllWindows()
+                return
+            streams[f"cam{idx}"] = (cap, pace_fps)
+            sources[f"cam{idx}"] = source
+        self.streams = {stream_id: self.create_stream_state(stream_id) for stream_id in streams}
         
         print("\n" + "="*60)
         print("🎥 STARTING FACE & VOICE DETECTION")
         print("="*60)
-        print(f"📊 Using {len(self.reference_embeddings)} face embeddings (downloaded from Firebase)")
+        print(f"📹 Video sources: {len(streams)}")
+        print(f"📊 Using {self.gallery.face_embedding_count} face embeddings of {self.gallery.face_count} "
+              f"people (downloaded from Firebase)")
         if self.enable_voice:
-            print(f"🎤 Using {len(self.voice_embeddings)} voice embeddings (downloaded from Firebase)")
+            print(f"🎤 Using {self.gallery.voice_count} voice embeddings (downloaded from Firebase)")
         print(f"🎯 Face similarity threshold: {self.similarity_threshold}")
         if self.enable_voice:
             print(f"🎯 Voice similarity threshold: {self.voice_similarity_threshold}")
@@ -1028,7 +1402,7 @@ class FirebaseFaceDetector:
         print(f"👥 Detects ALL speakers from database simultaneously")
         print("\nControls:")
         print("  'q' - Quit")
-        print("  'r' - Reload embeddings from Firebase")
+        print("  'r' - Reload embeddings from Firebase (in the background)")
         print("  'v' - Toggle voice detection")
         print("="*60 + "\n")
         
@@ -1036,73 +1410,91 @@ class FirebaseFaceDetector:
         if self.enable_voice:
             self.start_voice_detection()
         
-        # Set camera properties for smoother video
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer for lower latency
-        
-        frame_count = 0
-        target_fps = 30
-        frame_time = 1.0 / target_fps
-        
-        while True:
-            loop_start = time.time()
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Process frame
-            frame = self.process_frame(frame, frame_count)
-            
-            # Display frame
-            cv2.imshow('Firebase Face & Voice Detection', frame)
+        # Keep the gallery in sync with Firebase in the background
+        self.gallery_sync.start()
+        
+        # Keep the camera location fresh and deliver alerts (including any restored
+        # from a previous run) in the background
+        self.location_provider.start()
+        self.state_store.start()
+        if self.alert_dispatcher is not None:
+            self.alert_dispatcher.start()
+        self.evidence_writer.start()
+        
+        # Capture and inference run on their own threads; this thread only renders,
+        # so the display keeps up with the cameras however long inference takes
+        # A live stream that drops is reopened from its original source
+        pipeline = FramePipeline(streams, self.infer_frames, queue_size=self.pipeline_queue_size,
+                                 reopen=lambda stream_id: self.open_video_source(sources[stream_id])[0])
+        pipeline.start()
+        
+        running = True
+        while running and not pipeline.capture_finished():
+            shown = False
+            for stream_id, stream in self.streams.items():
+                queues = pipeline.queues[stream_id]
+                
+                # Pick up the newest inference result, if one arrived
+                while True:
+                    result = queues.results.get(timeout=0)
+                    if result is None:
+                        break
+                    stream.record_result(result)
+                
+                packet = queues.display.get(timeout=0)
+                if packet is None:
+                    continue
+                
+                stream.record_display(time.time())
+                faces_data = stream.latest_result.output if stream.latest_result is not None else []
+                status_lines = stream.status_lines()
+                if self.governor is not None:
+                    status_lines += self.governor.status_lines()
+                frame = self.draw_frame(packet.frame, faces_data, status_lines)
+                
+                # Display frame
+                cv2.imshow(window_names[stream_id], frame)
+                shown = True
             
-            frame_count += 1
+            if not shown:
+                time.sleep(0.005)
             
             # Handle keyboard input
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-            elif key == ord('r'):
-                # Reload embeddings from Firebase
-                self.reload_embeddings_from_firebase()
-                # Restart voice detection if it was running
-                if self.enable_voice and not self.listening:
-                    self.start_voice_detection()
-            elif key == ord('v'):
-                # Toggle voice detection
-                if self.enable_voice:
-                    if self.listening:
-                        self.stop_voice_detection()
-                    else:
-                        self.start_voice_detection()
-                # Restart voice detection if it was running
-                if self.enable_voice and not self.listening:
-                    self.start_voice_detection()
-            elif key == ord('v'):
-                # Toggle voice detection
-                if self.enable_voice:
-                    if self.listening:
-                        self.stop_voice_detection()
-                    else:
-                        self.start_voice_detection()
-            
-            # Frame rate limiting for smooth playback
-            elapsed = time.time() - loop_start
-            sleep_time = max(0, frame_time - elapsed)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            running = self.handle_key(cv2.waitKey(1) & 0xFF)
         
-        # Stop voice detection before closing
-        if self.enable_voice:
-            self.stop_voice_detection()
+        pipeline.stop()
+        
+        for stream_id, stream in self.streams.items():
+            if stream.latency_history:
+                latencies_ms = np.array(stream.latency_history) * 1000
+                print(f"⏱️  {stream_id} capture-to-decision latency (last {len(latencies_ms)} frames): "
+                      f"mean {latencies_ms.mean():.0f} ms, max {latencies_ms.max():.0f} ms")
+        print(f"⏭️  Frames skipped by inference to stay current: {pipeline.frames_skipped}")
+        for stream_id, stream in self.streams.items():
+            if stream.motion_gate is not None:
+                print(f"🚶 {stream_id} motion gate: detection skipped on {stream.motion_gate.frames_skipped} "
+                      f"frame(s), cropped on {stream.motion_gate.frames_cropped}")
         
         # Stop voice detection before closing
         if self.enable_voice:
             self.stop_voice_detection()
         
-        cap.release()
+        self.gallery_sync.stop()
+        if self.alert_dispatcher is not None:
+            self.alert_dispatcher.stop()
+        self.location_provider.stop()
+        
+        # Finish writing queued detection images
+        self.evidence_writer.stop()
+        if self.evidence_writer.dropped:
+            print(f"⚠️  Evidence writer dropped {self.evidence_writer.dropped} detection(s) while busy")
+        
+        # Write the remaining cooldown and saved-person changes
+        self.state_store.stop()
+        
+        # The pipeline holds the current capture of every stream (replaced on reconnect)
+        for cap, _ in pipeline.streams.values():
+            cap.release()
         cv2.destroyAllWindows()
 
 
@@ -1132,6 +1524,8 @@ if __name__ == "__main__":
         # sinch_from_number="YOUR_Sinch_number"
     )
     
-    # Run with webcam (0) or video file path
+    # Run with webcam (0), video file path or RTSP URL,
+    # or a list of them to watch several cameras with one model and gallery:
+    # detector.run(video_source=[0, 1, "rtsp://camera-3/stream"])
     detector.run(video_source=0)
 
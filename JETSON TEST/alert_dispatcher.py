@@ -0,0 +1,329 @@
+"""
+Asynchronous delivery of match alerts (SMS with the camera's location).
+
+The frame loop only calls AlertDispatcher.try_enqueue(), which checks and
+reserves the person's cooldown under a lock and appends the alert (with the
+camera's location) to an in-memory outbound queue. A worker thread hands
+queued alerts to a pluggable transport, retrying failures with exponential
+backoff. The worker also keeps the pending alerts in a JSON file, written
+whenever the queue changes, so alerts that were queued but not yet delivered
+survive a restart; the frame loop never waits on that write.
+
+Transports:
+    SinchSmsTransport   sends the alert as an SMS through Sinch
+    FakeTransport       records alerts in memory (for local testing)
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class AlertDeliveryError(Exception):
+    """Delivery failed but may succeed later; the alert is retried."""
+
+
+class PermanentAlertError(Exception):
+    """Delivery can never succeed (e.g. no contact number); the alert is dropped."""
+
+
+def format_phone_number(contact_number):
+    """Normalize a contact number to E.164 (numbers without a country code are assumed to be US numbers)."""
+    contact_number = contact_number.strip()
+    if contact_number.startswith('+'):
+        return contact_number
+    if contact_number.startswith('1'):
+        return '+' + contact_number
+    return '+1' + contact_number.replace('-', '').replace(' ', '').replace('(', '').replace(')', '')
+
+
+def format_alert_message(alert):
+    """SMS text for an alert: name, age and coordinates."""
+    location = alert.get('location') or {}
+    return (f"{alert['name']}\n{alert.get('age', 'N/A')}\n"
+            f"{location.get('latitude', 0.0):.6f},{location.get('longitude', 0.0):.6f}")
+
+
+class AlertTransport:
+    """Base class for alert transports."""
+
+    def send(self, alert):
+        """
+        Deliver one alert.
+
+        Raises:
+            AlertDeliveryError: Temporary failure (the alert is retried)
+            PermanentAlertError: The alert can never be delivered
+        """
+        raise NotImplementedError
+
+
+class SinchSmsTransport(AlertTransport):
+    def __init__(self, sinch_client, from_number=None):
+        """
+        Args:
+            sinch_client: Initialized SinchClient
+            from_number: Sinch number to send from
+        """
+        self.sinch_client = sinch_client
+        self.from_number = from_number
+
+    def send(self, alert):
+        contact = (alert.get('contact') or '').strip()
+        if not contact or contact == 'N/A':
+            raise PermanentAlertError(f"No contact number for {alert['name']}")
+        contact_number = format_phone_number(contact)
+
+        try:
+            response = self.sinch_client.sms.batches.send(
+                body=format_alert_message(alert),
+                to=[contact_number],
+                from_=self.from_number,
+                delivery_report="none"
+            )
+        except Exception as e:
+            raise AlertDeliveryError(f"Sinch send to {contact_number} failed: {e}") from e
+        print(f"✅ SMS sent to {contact_number} for {alert['name']}")
+        print(f"   Response: {response}")
+
+
+class FakeTransport(AlertTransport):
+    """In-memory transport for testing; optionally fails the first few sends."""
+
+    def __init__(self, fail_times=0):
+        """
+        Args:
+            fail_times: Number of initial send() calls that raise AlertDeliveryError
+        """
+        self.fail_times = fail_times
+        self.sent = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, alert):
+        with self._lock:
+            self.attempts += 1
+            if self.attempts <= self.fail_times:
+                raise AlertDeliveryError(f"Simulated failure {self.attempts}/{self.fail_times}")
+            self.sent.append(dict(alert))
+        print(f"📨 [fake] Alert for {alert['name']}: {format_alert_message(alert)!r}")
+
+
+class AlertDispatcher:
+    def __init__(self, transport, cooldown=3600.0,
+                 queue_path='alert_queue.json', max_attempts=8,
+                 base_backoff=2.0, max_backoff=300.0, state_store=None):
+        """
+        Args:
+            transport: AlertTransport used to deliver alerts
+            cooldown: Minimum seconds between alerts for the same person
+            queue_path: JSON file holding undelivered alerts (None = memory only)
+            max_attempts: Delivery attempts before an alert is dropped
+            base_backoff: Delay in seconds before the first retry (doubles per attempt)
+            max_backoff: Upper bound on the retry delay in seconds
+            state_store: DetectionStateStore that persists cooldowns across restarts
+                         (None = cooldowns are kept in memory only)
+        """
+        self.transport = transport
+        self.cooldown = cooldown
+        self.queue_path = Path(queue_path) if queue_path else None
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state_store = state_store
+
+        self._condition = threading.Condition()
+        self._pending = []
+        self._queue_dirty = False  # Pending alerts changed since the queue file was written
+        self._save_lock = threading.Lock()
+        self._last_alert_times = {}  # {person_key: time the last delivered or pending alert was queued}
+        if state_store is not None:
+            now = time.time()
+            self._last_alert_times = {key: alert_time for key, alert_time in state_store.alert_times.items()
+                                      if now - alert_time < cooldown}
+            state_store.prune_alerts(now - cooldown)
+        self._stop = False
+        self._thread = None
+
+        self._load_queue()
+
+    def start(self):
+        """Start the delivery thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the delivery thread; undelivered alerts stay in the persistent queue."""
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        # Also covers alerts queued while the delivery thread was not running
+        self._flush_queue()
+
+    def cooldown_remaining(self, person_key, now=None):
+        """Seconds until another alert may be queued for person_key (0 if none is blocking)."""
+        now = time.time() if now is None else now
+        with self._condition:
+            last_time = self._last_alert_times.get(person_key)
+        if last_time is None:
+            return 0.0
+        return max(0.0, self.cooldown - (now - last_time))
+
+    def try_enqueue(self, person_key, name, match_info, location=None, now=None):
+        """
+        Queue an alert unless the person's cooldown is active.
+
+        The cooldown check and reservation happen under one lock, so concurrent
+        detections of the same person (e.g. on two cameras) queue one alert.
+        Never blocks on the network or the disk; the delivery thread saves the queue.
+
+        Args:
+            person_key: Key the cooldown is kept under
+            name: Name of the detected person
+            match_info: Gallery info of the person (age, contact, docId)
+            location: Location dict of the camera (see LocationProvider.get_location)
+
+        Returns:
+            True if an alert was queued
+        """
+        now = time.time() if now is None else now
+        match_info = match_info or {}
+        with self._condition:
+            last_time = self._last_alert_times.get(person_key)
+            if last_time is not None and now - last_time < self.cooldown:
+                return False
+
+            self._pending.append({
+                'id': uuid.uuid4().hex,
+                'personKey': person_key,
+                'previousAlertTime': last_time,
+                'name': name,
+                'age': match_info.get('age', 'N/A'),
+                'contact': match_info.get('contact', ''),
+                'docId': match_info.get('docId'),
+                'createdAt': now,
+                'attempts': 0,
+                'nextAttemptAt': now,
+                'location': location,
+                'lastError': None,
+            })
+            self._last_alert_times[person_key] = now
+            if self.state_store is not None:
+                self.state_store.record_alert(person_key, now)
+            self._queue_dirty = True
+            self._condition.notify_all()
+        return True
+
+    @property
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                alert = None
+                while not self._stop and not self._queue_dirty:
+                    now = time.time()
+                    due = min(self._pending, key=lambda a: a['nextAttemptAt'], default=None)
+                    if due is not None and due['nextAttemptAt'] <= now:
+                        alert = due
+                        break
+                    self._condition.wait(timeout=None if due is None else due['nextAttemptAt'] - now)
+                stopping = self._stop
+
+            # Persist queue changes before (possibly slow) delivery
+            self._flush_queue()
+            if stopping:
+                return
+            if alert is not None:
+                self._deliver(alert)
+
+    def _deliver(self, alert):
+        try:
+            self.transport.send(alert)
+        except PermanentAlertError as e:
+            print(f"❌ Dropping alert for {alert['name']}: {e}")
+            self._finish(alert, delivered=False)
+            return
+        except Exception as e:
+            self._retry(alert, e)
+            return
+        self._finish(alert, delivered=True)
+
+    def _retry(self, alert, error):
+        with self._condition:
+            alert['attempts'] += 1
+            alert['lastError'] = str(error)
+            if alert['attempts'] >= self.max_attempts:
+                print(f"❌ Giving up on alert for {alert['name']} after {alert['attempts']} attempts: {error}")
+                self._remove(alert, delivered=False)
+                return
+            delay = min(self.max_backoff, self.base_backoff * (2 ** (alert['attempts'] - 1)))
+            delay *= random.uniform(0.8, 1.2)  # Jitter so queued alerts do not retry in lockstep
+            alert['nextAttemptAt'] = time.time() + delay
+            self._queue_dirty = True
+        print(f"⚠️  Alert for {alert['name']} failed ({error}); retrying in {delay:.0f}s")
+
+    def _finish(self, alert, delivered):
+        with self._condition:
+            self._remove(alert, delivered)
+        if delivered:
+            print(f"📱 Alert delivered for {alert['name']}")
+
+    def _remove(self, alert, delivered):
+        """Remove an alert from the queue (lock held); undelivered alerts release their cooldown."""
+        self._pending = [a for a in self._pending if a['id'] != alert['id']]
+        if not delivered and self._last_alert_times.get(alert['personKey']) == alert['createdAt']:
+            if alert['previousAlertTime'] is None:
+                self._last_alert_times.pop(alert['personKey'], None)
+            else:
+                self._last_alert_times[alert['personKey']] = alert['previousAlertTime']
+            if self.state_store is not None:
+                self.state_store.record_alert(alert['personKey'], alert['previousAlertTime'])
+        self._queue_dirty = True
+
+    def _flush_queue(self):
+        """Write the pending alerts atomically if they changed (delivery thread, or stop())."""
+        with self._save_lock:
+            with self._condition:
+                if not self._queue_dirty:
+                    return
+                self._queue_dirty = False
+                pending = [dict(alert) for alert in self._pending]
+            self._save_queue(pending)
+
+    def _save_queue(self, pending):
+        if self.queue_path is None:
+            return
+        try:
+            self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.queue_path.with_name(self.queue_path.name + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({'pending': pending}, f, default=str)
+            os.replace(temp_path, self.queue_path)
+        except OSError as e:
+            print(f"⚠️  Could not save alert queue to {self.queue_path}: {e}")
+
+    def _load_queue(self):
+        if self.queue_path is None or not self.queue_path.exists():
+            return
+        try:
+            with open(self.queue_path, "r", encoding="utf-8") as f:
+                self._pending = json.load(f).get('pending', [])
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load alert queue from {self.queue_path}: {e}")
+            return
+        for alert in self._pending:
+            self._last_alert_times[alert['personKey']] = alert['createdAt']
+        if self._pending:
+            print(f"📨 {len(self._pending)} undelivered alert(s) restored from {self.queue_path}")
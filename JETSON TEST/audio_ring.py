@@ -0,0 +1,133 @@
+"""
+Gapless microphone capture for voice detection.
+
+    sounddevice callback ──► AudioRingBuffer ──► voice thread
+     (PortAudio thread)       (fixed size)        (sliding window every hop,
+                                                   VAD gate, then encoder)
+
+The audio callback only copies each block into a preallocated ring and then
+advances a sample counter. The voice thread reads the newest window_samples
+whenever hop_samples new samples have arrived. Windows overlap, so an
+utterance crossing a window boundary is also seen whole in the next window,
+and audio keeps being captured while the encoder runs. The ring has a single
+writer and a single reader and uses no locks: the writer publishes a block
+by advancing the counter after the samples are in place, and the reader
+re-checks the counter after copying to detect samples overwritten meanwhile.
+"""
+import time
+
+import numpy as np
+
+try:
+    import webrtcvad
+except ImportError:
+    # webrtcvad not installed (it normally comes with resemblyzer), use the energy gate only
+    webrtcvad = None
+
+
+class AudioRingBuffer:
+    """Single-producer, single-consumer ring of mono float32 samples."""
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: Number of samples kept (must exceed the longest window read)
+        """
+        self.capacity = int(capacity)
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self._written = 0  # Total samples ever written; only the writer changes it
+        self.overflows = 0
+
+    @property
+    def written(self):
+        return self._written
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones (writer thread only)."""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)[-self.capacity:]
+        start = self._written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:len(samples) - first] = samples[first:]
+        # Publish only after the samples are in place
+        self._written += len(samples)
+
+    def callback(self, indata, frames, time_info, status):
+        """sounddevice.InputStream callback: store the first channel of each block."""
+        if status and status.input_overflow:
+            self.overflows += 1
+        self.write(indata[:, 0])
+
+    def read(self, end, count):
+        """
+        Copy the count samples that end at sample position end.
+
+        Returns:
+            float32 array, or None if those samples were not written yet or
+            have already been overwritten
+        """
+        start = end - count
+        if start < 0 or end > self._written or self._written - start > self.capacity:
+            return None
+        indices = np.arange(start, end) % self.capacity
+        samples = self._buffer[indices]
+        # The writer may have lapped the window while it was being copied
+        if self._written - start > self.capacity:
+            return None
+        return samples
+
+    def wait_for(self, position, timeout, sample_rate):
+        """
+        Sleep until at least position samples have been written.
+
+        Returns:
+            True if they were written before the timeout
+        """
+        deadline = time.time() + timeout
+        while self._written < position:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            # Sleep roughly until the samples are due, but wake up regularly
+            time.sleep(min(remaining, max(0.005, (position - self._written) / sample_rate), 0.1))
+        return True
+
+
+class VoiceActivityDetector:
+    """Decides whether an audio window contains enough speech to be embedded."""
+
+    FRAME_DURATION = 0.03  # webrtcvad accepts 10, 20 or 30 ms frames
+
+    def __init__(self, sample_rate=16000, aggressiveness=2, min_speech_ratio=0.2,
+                 energy_threshold_db=-50.0):
+        """
+        Args:
+            sample_rate: Sample rate of the windows (webrtcvad needs 8, 16, 32 or 48 kHz)
+            aggressiveness: webrtcvad aggressiveness, 0 (lenient) to 3 (strict)
+            min_speech_ratio: Fraction of 30 ms frames that must contain speech
+            energy_threshold_db: Windows quieter than this RMS level (dBFS) are
+                                 skipped without running webrtcvad
+        """
+        self.sample_rate = sample_rate
+        self.min_speech_ratio = min_speech_ratio
+        self.energy_threshold_db = energy_threshold_db
+        self._frame_length = int(sample_rate * self.FRAME_DURATION)
+        self._vad = webrtcvad.Vad(aggressiveness) if webrtcvad is not None else None
+
+    def is_speech(self, samples):
+        rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64))) if len(samples) else 0.0
+        if 20 * np.log10(rms + 1e-10) < self.energy_threshold_db:
+            return False
+        if self._vad is None:
+            return True
+
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        frame_count = len(pcm) // self._frame_length
+        if frame_count == 0:
+            return True
+        speech_frames = sum(
+            self._vad.is_speech(pcm[i * self._frame_length:(i + 1) * self._frame_length].tobytes(),
+                                self.sample_rate)
+            for i in range(frame_count)
+        )
+        return speech_frames / frame_count >= self.min_speech_ratio
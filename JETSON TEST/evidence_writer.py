@@ -0,0 +1,221 @@
+"""
+Background writer for detected-person evidence.
+
+The frame loop hands a detection to EvidenceWriter.submit(), which only puts
+it on a bounded queue. A worker thread crops and annotates the frame, encodes
+both images as JPEG and appends one structured JSON record per detection to
+detections.jsonl. When the disk cannot keep up, the queue applies the
+configured drop policy instead of stalling detection. The optional on_done
+callback reports the outcome of every queued detection (written, or dropped
+or failed), so callers only treat a person as saved once the files exist.
+"""
+import json
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+RECORDS_FILE = "detections.jsonl"
+
+
+class EvidenceWriter:
+    def __init__(self, storage_dir="detected_persons", jpeg_quality=90, queue_size=16,
+                 drop_policy='drop_newest', block_timeout=0.05, padding=20, on_done=None):
+        """
+        Args:
+            storage_dir: Directory for images and the detections.jsonl records
+            jpeg_quality: JPEG quality (0-100) for saved images
+            queue_size: Detections waiting to be written before the drop policy applies
+            drop_policy: What to do when the queue is full:
+                         'drop_newest' rejects the new detection (submit returns False,
+                         so the caller can try again later), 'drop_oldest' discards the
+                         oldest waiting detection, 'block' waits up to block_timeout
+                         seconds for space and then rejects
+            block_timeout: Longest time submit() waits with the 'block' policy
+            padding: Pixels of context kept around the face in the cropped image
+            on_done: Callable(person_key, stream_id, saved) called once for every queued
+                     detection: saved is True after it was written, False if it was
+                     discarded by 'drop_oldest' or could not be written. Runs on the
+                     writer thread (or on the submitting thread for 'drop_oldest')
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown evidence drop policy: {drop_policy}")
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.jpeg_quality = int(jpeg_quality)
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.padding = padding
+        self.on_done = on_done
+
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Write the detections still queued, then stop the writer thread."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("⚠️  Evidence queue did not drain; some detections were not saved")
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, frame, bbox, name, match_info, person_key, stream_id=None, detected_at=None):
+        """
+        Queue a detection to be saved. Never blocks longer than block_timeout.
+
+        The frame is written as-is later, so it must not be modified after submit().
+
+        Args:
+            frame: Full frame the person was detected in
+            bbox: (x1, y1, x2, y2) face box in frame coordinates
+            name: Person's name
+            match_info: Additional information about the person
+            person_key: Unique key for the person
+            stream_id: Camera the detection came from
+            detected_at: Detection time (datetime, defaults to now)
+
+        Returns:
+            True if the detection was queued
+        """
+        item = {
+            'frame': frame,
+            'bbox': tuple(int(v) for v in bbox),
+            'name': name,
+            'match_info': dict(match_info or {}),
+            'person_key': person_key,
+            'stream_id': stream_id,
+            'detected_at': detected_at or datetime.now(),
+        }
+
+        if self.drop_policy == 'block':
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        self.dropped += 1
+        if self.drop_policy == 'drop_newest':
+            return False
+
+        # drop_oldest: make room by discarding the oldest waiting detection
+        try:
+            discarded = self._queue.get_nowait()
+            if discarded is None:
+                # Keep the stop sentinel at the end of the queue
+                self._queue.put_nowait(None)
+                return False
+            print(f"⚠️  Evidence queue full; dropped detection of {discarded['name']}")
+            self._done(discarded, False)
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    @property
+    def pending_count(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(item)
+                self.written += 1
+            except Exception as e:
+                print(f"❌ Error saving evidence for {item['name']}: {e}")
+                self._done(item, False)
+                continue
+            self._done(item, True)
+
+    def _done(self, item, saved):
+        if self.on_done is None:
+            return
+        try:
+            self.on_done(item['person_key'], item['stream_id'], saved)
+        except Exception as e:
+            print(f"⚠️  Evidence completion callback failed for {item['name']}: {e}")
+
+    def _encode(self, image):
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        return encoded.tobytes()
+
+    def _write(self, item):
+        frame = item['frame']
+        x1, y1, x2, y2 = item['bbox']
+        name = item['name']
+        match_info = item['match_info']
+        detected_at = item['detected_at']
+
+        # Extract person region with some padding
+        h, w = frame.shape[:2]
+        person_crop = frame[max(0, y1 - self.padding):min(h, y2 + self.padding),
+                            max(0, x1 - self.padding):min(w, x2 + self.padding)]
+
+        # Annotate a copy of the full frame
+        annotated_frame = frame.copy()
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+        cv2.putText(annotated_frame, f"{name} - SAVED", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+        timestamp = detected_at.strftime("%Y%m%d_%H%M%S")
+        safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
+        base_name = f"{safe_name}_{timestamp}_{item['person_key'][:8]}"
+        crop_filename = f"{base_name}.jpg"
+        full_frame_filename = f"{base_name}_FULL.jpg"
+
+        with open(self.storage_dir / crop_filename, 'wb') as f:
+            f.write(self._encode(person_crop))
+        with open(self.storage_dir / full_frame_filename, 'wb') as f:
+            f.write(self._encode(annotated_frame))
+
+        record = {
+            'name': name,
+            'age': match_info.get('age', 'N/A'),
+            'city': match_info.get('city', 'N/A'),
+            'dateLastSeen': match_info.get('dateSeen', 'N/A'),
+            'contact': match_info.get('contact', 'N/A'),
+            'docId': match_info.get('docId'),
+            'personKey': item['person_key'],
+            'stream': item['stream_id'],
+            'detectedAt': detected_at.isoformat(),
+            'bbox': [x1, y1, x2, y2],
+            'croppedImage': crop_filename,
+            'fullFrame': full_frame_filename,
+            'jpegQuality': self.jpeg_quality,
+        }
+        with open(self.storage_dir / RECORDS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+        print(f"💾 SAVED: {name} - {crop_filename} (+ full frame, record in {RECORDS_FILE})")
@@ -0,0 +1,203 @@
+"""
+Lightweight IoU tracker for faces in one video stream.
+
+Detections are associated with existing tracks by greedy IoU matching, so
+every face keeps a track ID across frames. Each track smooths its own
+similarity scores and votes on its identity over its last few recognitions,
+instead of mixing the scores of every face in the frame together. Stable
+tracks are only re-embedded periodically (unidentified ones more often than
+identified ones) or when the face's box changes noticeably, which saves
+recognition calls in crowded scenes, where most faces are strangers.
+"""
+from collections import Counter, deque
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Intersection-over-union of every box in boxes_a with every box in boxes_b.
+
+    Args:
+        boxes_a: (N, 4) array of x1, y1, x2, y2
+        boxes_b: (M, 4) array of x1, y1, x2, y2
+
+    Returns:
+        (N, M) IoU matrix
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+
+def _box_area(box):
+    return max(0.0, float(box[2] - box[0])) * max(0.0, float(box[3] - box[1]))
+
+
+class FaceTrack:
+    """One tracked face: its box, recent recognitions and current identity."""
+
+    def __init__(self, track_id, bbox, det_score, history_size):
+        self.track_id = track_id
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.det_score = float(det_score)
+        self.hits = 1
+        self.missed = 0
+
+        # Recent recognitions: one {docId: similarity} dict per embedding
+        self.observations = deque(maxlen=history_size)
+        self.infos = {}  # {docId: gallery info} for every candidate seen
+        self.candidates = []
+
+        # State when the track was last embedded, to decide when to re-embed
+        self.frames_since_embedding = None
+        self.embedded_area = None
+        self.embedded_det_score = None
+
+        self.identity = None  # docId voted for by the recent recognitions
+        self.similarity = 0.0  # smoothed similarity to that identity
+
+    def observe(self, candidates, infos):
+        """
+        Record one recognition of this track and re-run the identity vote.
+
+        Args:
+            candidates: Per-person candidates from build_match_candidates, best first
+            infos: {docId: gallery info} for the candidates
+        """
+        self.observations.append({c['docId']: c['similarity'] for c in candidates})
+        self.infos.update(infos)
+        self.candidates = candidates
+        self.frames_since_embedding = 0
+        self.embedded_area = _box_area(self.bbox)
+        self.embedded_det_score = self.det_score
+
+        # Majority vote over the best candidate of each recognition; ties go to
+        # the identity with the higher smoothed similarity
+        votes = Counter(max(obs, key=obs.get) for obs in self.observations if obs)
+        if not votes:
+            self.identity, self.similarity = None, 0.0
+            return
+
+        def smoothed(doc_id):
+            # Recognitions where the identity was not among the candidates count as 0
+            return float(np.mean([obs.get(doc_id, 0.0) for obs in self.observations]))
+
+        self.identity = max(votes, key=lambda doc_id: (votes[doc_id], smoothed(doc_id)))
+        self.similarity = smoothed(self.identity)
+
+    @property
+    def match_info(self):
+        return self.infos.get(self.identity) if self.identity is not None else None
+
+
+class FaceTracker:
+    def __init__(self, smoothing_frames=5, iou_threshold=0.3, max_missed=5,
+                 reembed_interval=10, unknown_reembed_interval=3, min_hits=3, area_change=0.5,
+                 det_score_gain=0.1):
+        """
+        Args:
+            smoothing_frames: Recognitions per track used for smoothing and identity voting
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_missed: Frames a track survives without a matching detection
+            reembed_interval: Frames between re-embeddings of a stable, identified track
+            unknown_reembed_interval: Frames between re-embeddings of a stable track that is
+                                      not identified (yet)
+            min_hits: Detections before a track counts as stable
+            area_change: Re-embed when the box area changes by more than this fraction
+                         since the last embedding (the face moved closer or further away)
+            det_score_gain: Re-embed when the detection score improves by more than this
+                            since the last embedding (e.g. the face turned to the camera)
+        """
+        self.smoothing_frames = smoothing_frames
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reembed_interval = reembed_interval
+        self.unknown_reembed_interval = unknown_reembed_interval
+        self.min_hits = min_hits
+        self.area_change = area_change
+        self.det_score_gain = det_score_gain
+
+        self.tracks = []
+        self._next_track_id = 1
+
+    def update(self, bboxes, det_scores):
+        """
+        Associate one frame's detections with tracks.
+
+        Args:
+            bboxes: (N, 4) detection boxes in frame coordinates
+            det_scores: (N,) detection confidences
+
+        Returns:
+            List with the FaceTrack of each detection, in detection order
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        assigned = [None] * len(bboxes)
+
+        # Greedy association, highest IoU first
+        if self.tracks and len(bboxes):
+            ious = iou_matrix([track.bbox for track in self.tracks], bboxes)
+            for flat_idx in np.argsort(-ious, axis=None):
+                track_idx, det_idx = np.unravel_index(flat_idx, ious.shape)
+                if ious[track_idx, det_idx] < self.iou_threshold:
+                    break
+                track = self.tracks[track_idx]
+                if assigned[det_idx] is not None or track.missed < 0:
+                    continue
+                track.bbox = bboxes[det_idx]
+                track.det_score = float(det_scores[det_idx])
+                track.hits += 1
+                track.missed = -1  # Marks the track as matched in this frame
+                assigned[det_idx] = track
+
+        for track in self.tracks:
+            track.missed = 0 if track.missed < 0 else track.missed + 1
+            if track.frames_since_embedding is not None:
+                track.frames_since_embedding += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for det_idx, track in enumerate(assigned):
+            if track is None:
+                track = FaceTrack(self._next_track_id, bboxes[det_idx], det_scores[det_idx], self.smoothing_frames)
+                self._next_track_id += 1
+                self.tracks.append(track)
+                assigned[det_idx] = track
+
+        return assigned
+
+    def visible_tracks(self):
+        """Tracks that matched a detection in the latest update."""
+        return [track for track in self.tracks if track.missed == 0]
+
+    def needs_embedding(self, track, similarity_threshold):
+        """
+        Decide whether a track must be recognized again in this frame.
+
+        New and unstable tracks are embedded every frame. A stable track is
+        re-embedded every reembed_interval frames if it is identified above
+        similarity_threshold and every unknown_reembed_interval frames if not,
+        or sooner if its box size or detection score changed noticeably since
+        the last embedding.
+        """
+        if track.frames_since_embedding is None or track.hits < self.min_hits:
+            return True
+        identified = track.identity is not None and track.similarity > similarity_threshold
+        interval = self.reembed_interval if identified else self.unknown_reembed_interval
+        if track.frames_since_embedding >= interval:
+            return True
+
+        area = _box_area(track.bbox)
+        if track.embedded_area and abs(area - track.embedded_area) > self.area_change * track.embedded_area:
+            return True
+        return track.det_score - track.embedded_det_score > self.det_score_gain
@@ -0,0 +1,278 @@
+"""
+Threaded capture / inference / render pipeline for the detector.
+
+    capture thread (per stream) ──► inference queue ──┐
+          │                                           ▼
+          │                                 inference thread (batches the
+          │                                 newest frame of every stream)
+          │                                           │
+          │                                           ▼
+          └──► display queue ──► render ◄── result queue (per stream)
+                              (caller's thread)
+
+Every queue is bounded and drops its oldest item when full, so a slow stage
+never makes the stages before it wait. Inference drains its queue and works
+on the newest frame of each stream (any older queued frames are skipped),
+whatever the queue size, and the display keeps
+running at camera rate while drawing the latest available inference result.
+Each frame is stamped when it is captured, so every result carries its
+capture-to-decision latency. A live source (camera or network stream) whose
+read fails is released and reopened with exponential backoff, so one dropped
+RTSP connection does not leave that camera blind; a video file ends its
+stream at the first failed read.
+"""
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue:
+    """Bounded thread-safe queue that discards its oldest item when full."""
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=max(1, maxsize))
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if the queue is full."""
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest item.
+
+        Args:
+            timeout: Seconds to wait for an item (0 = don't wait, None = wait forever)
+
+        Returns:
+            The item, or None on timeout or when the queue is closed and empty
+        """
+        with self._condition:
+            if not self._items and not self._closed and timeout != 0:
+                self._condition.wait_for(lambda: self._items or self._closed, timeout=timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_latest(self, timeout=None):
+        """
+        Remove all items and return the newest one; the older ones count as dropped.
+
+        Args:
+            timeout: Seconds to wait for an item (0 = don't wait, None = wait forever)
+
+        Returns:
+            The newest item, or None on timeout or when the queue is closed and empty
+        """
+        with self._condition:
+            if not self._items and not self._closed and timeout != 0:
+                self._condition.wait_for(lambda: self._items or self._closed, timeout=timeout)
+            if not self._items:
+                return None
+            self.dropped += len(self._items) - 1
+            item = self._items.pop()
+            self._items.clear()
+            return item
+
+    def close(self):
+        """Wake up waiting consumers; get() returns None once the queue is drained."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FramePacket:
+    """A captured frame with its stream and capture timestamp."""
+
+    __slots__ = ('stream_id', 'frame_id', 'frame', 'captured_at')
+
+    def __init__(self, stream_id, frame_id, frame, captured_at):
+        self.stream_id = stream_id
+        self.frame_id = frame_id
+        self.frame = frame
+        self.captured_at = captured_at
+
+
+class FrameResult:
+    """Inference output for one frame, with its capture-to-decision latency."""
+
+    __slots__ = ('stream_id', 'frame_id', 'captured_at', 'decided_at', 'latency', 'output')
+
+    def __init__(self, packet, decided_at, output):
+        self.stream_id = packet.stream_id
+        self.frame_id = packet.frame_id
+        self.captured_at = packet.captured_at
+        self.decided_at = decided_at
+        self.latency = decided_at - packet.captured_at
+        self.output = output
+
+
+class StreamQueues:
+    """The queues connecting one video stream to the inference and render stages."""
+
+    def __init__(self, queue_size):
+        self.inference = DropOldestQueue(queue_size)
+        self.display = DropOldestQueue(queue_size)
+        self.results = DropOldestQueue(queue_size)
+
+
+class FramePipeline:
+    def __init__(self, streams, infer, queue_size=1, reopen=None, reconnect_delay=1.0, max_reconnect_delay=30.0):
+        """
+        Args:
+            streams: {stream_id: (cap, pace_fps)} where cap is an opened
+                     cv2.VideoCapture and pace_fps limits how fast it is read (use
+                     for video files, which would otherwise be read as fast as
+                     possible; None = source rate)
+            infer: Callable(list of FramePacket) -> list of outputs (one per
+                   packet), run on the inference thread with the newest frame of
+                   every stream that has one
+            queue_size: Capacity of each stage queue; larger queues smooth the display,
+                        inference always takes the latest frame
+            reopen: Callable(stream_id) -> new opened capture or None, used to reconnect
+                    live streams (pace_fps None) after a failed read (None = end the stream)
+            reconnect_delay: Seconds before the first reconnection attempt (doubles per failure)
+            max_reconnect_delay: Upper bound on the delay between reconnection attempts
+        """
+        self.streams = dict(streams)  # Current capture of every stream (replaced on reconnect)
+        self.infer = infer
+        self.reopen = reopen
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self.queues = {stream_id: StreamQueues(queue_size) for stream_id in self.streams}
+
+        self._frame_ready = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start one capture thread per stream and the inference thread."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, args=(stream_id,),
+                             name=f"frame-capture-{stream_id}", daemon=True)
+            for stream_id in self.streams
+        ]
+        self._threads.append(threading.Thread(target=self._inference_loop, name="frame-inference", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop all threads and wait for them to finish."""
+        self._stop.set()
+        self._frame_ready.set()
+        for queues in self.queues.values():
+            queues.inference.close()
+            queues.display.close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def capture_finished(self, stream_id=None):
+        """True once the stream (or, if stream_id is None, every stream) has no more frames."""
+        if stream_id is not None:
+            return self.queues[stream_id].display.closed
+        return all(queues.display.closed for queues in self.queues.values())
+
+    @property
+    def frames_skipped(self):
+        """Frames dropped by the inference stage to stay on the newest frame."""
+        return sum(queues.inference.dropped for queues in self.queues.values())
+
+    def _capture_loop(self, stream_id):
+        cap, pace_fps = self.streams[stream_id]
+        queues = self.queues[stream_id]
+        frame_id = 0
+        frame_interval = 1.0 / pace_fps if pace_fps else 0.0
+        next_read = time.perf_counter()
+
+        while not self._stop.is_set():
+            if frame_interval:
+                delay = next_read - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_read = max(next_read + frame_interval, time.perf_counter())
+
+            ret, frame = cap.read()
+            if not ret:
+                if pace_fps or self.reopen is None:
+                    break  # End of a video file
+                cap = self._reconnect(stream_id, cap)
+                if cap is None:
+                    break  # Stopped while reconnecting
+                continue
+
+            packet = FramePacket(stream_id, frame_id, frame, time.perf_counter())
+            queues.inference.put(packet)
+            queues.display.put(packet)
+            self._frame_ready.set()
+            frame_id += 1
+
+        queues.inference.close()
+        queues.display.close()
+        self._frame_ready.set()
+
+    def _reconnect(self, stream_id, cap):
+        """Release a failed live capture and reopen it with backoff; returns None once stopped."""
+        cap.release()
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            print(f"⚠️  Lost stream {stream_id}; reconnecting in {delay:.0f}s")
+            if self._stop.wait(delay):
+                break
+            try:
+                new_cap = self.reopen(stream_id)
+            except Exception as e:
+                print(f"⚠️  Reopening stream {stream_id} failed: {e}")
+                new_cap = None
+            if new_cap is not None and self._stop.is_set():
+                new_cap.release()
+                break
+            if new_cap is not None:
+                self.streams[stream_id] = (new_cap, None)
+                self.reconnects += 1
+                print(f"✅ Stream {stream_id} reconnected")
+                return new_cap
+            delay = min(self.max_reconnect_delay, delay * 2)
+        return None
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            self._frame_ready.wait(timeout=0.1)
+            self._frame_ready.clear()
+
+            packets = []
+            for queues in self.queues.values():
+                packet = queues.inference.get_latest(timeout=0)
+                if packet is not None:
+                    packets.append(packet)
+
+            if not packets:
+                if all(queues.inference.closed for queues in self.queues.values()):
+                    break
+                continue
+
+            try:
+                outputs = self.infer(packets)
+            except Exception as e:
+                print(f"⚠️  Frame inference failed: {e}")
+                continue
+
+            decided_at = time.perf_counter()
+            for packet, output in zip(packets, outputs):
+                self.queues[packet.stream_id].results.put(FrameResult(packet, decided_at, output))
+
+        for queues in self.queues.values():
+            queues.results.close()
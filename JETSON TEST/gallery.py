@@ -0,0 +1,80 @@
+"""
+Matching-ready gallery built from a GallerySnapshot.
+
+A Gallery bundles everything the detector reads while matching (embedding
+matrices, search indexes and the person table) into one immutable object.
+Faces are matched per person: all photos of a person form one identity that
+gets one aggregated score. Face identities and voice rows refer to a shared
+PersonTable row instead of carrying their own copy of the person's details.
+Updates build a new Gallery from the previous one (reusing its trained IVF
+centroids and the inverted lists of unchanged rows) and replace the detector's
+reference in a single assignment, so a frame or voice chunk that grabbed the old reference keeps a
+consistent view and never sees a half-built index.
+"""
+import numpy as np
+
+from gallery_index import IdentityGallery, VoiceGallery
+
+
+class Gallery:
+    def __init__(self, snapshot, index_kind='auto', nprobe=8, aggregation='max', aggregation_top_n=3,
+                 previous=None):
+        """
+        Args:
+            snapshot: GallerySnapshot to build from
+            index_kind: Face index backend passed to create_gallery_index
+            nprobe: IVF clusters scanned per query
+            aggregation: How a person's photo scores combine: 'max', 'mean_top_n' or 'centroid'
+            aggregation_top_n: Photos averaged per person with 'mean_top_n'
+            previous: Gallery this one replaces; its face index is updated instead of rebuilt
+        """
+        self.snapshot = snapshot
+        # Person details are stored once, in the snapshot's table, shared by the face and voice rows
+        self.people = snapshot.people
+
+        # Face index results are identity numbers; each maps to one person row
+        self.face_people, row_identities = snapshot.face_identities()
+        self.face_photo_counts = np.bincount(row_identities, minlength=len(self.face_people)).astype(np.int32)
+        self.face_embedding_count = len(row_identities)
+
+        self.face_embeddings = snapshot.face_embeddings if self.face_embedding_count > 0 else None
+        self.face_index = None
+        if self.face_embeddings is not None:
+            previous_index = previous.face_index if previous is not None else None
+            previous_rows = None
+            if previous_index is not None and snapshot.parent_generation == previous.snapshot.generation:
+                previous_rows = snapshot.parent_face_rows
+            self.face_index = IdentityGallery(self.face_embeddings, row_identities, aggregation=aggregation,
+                                              top_n=aggregation_top_n, index_kind=index_kind, nprobe=nprobe,
+                                              previous=previous_index, previous_rows=previous_rows)
+
+        self.voice_people = snapshot.voice_rows
+        self.voice_embeddings = snapshot.voice_embeddings if self.voice_count > 0 else None
+        self.voice_index = VoiceGallery(self.voice_embeddings) if self.voice_embeddings is not None else None
+
+    @property
+    def face_count(self):
+        """Number of people with face embeddings."""
+        return len(self.face_people)
+
+    @property
+    def voice_count(self):
+        return len(self.voice_people)
+
+    def face_name(self, identity):
+        return self.people.value(self.face_people[identity], "name")
+
+    def face_doc_id(self, identity):
+        return self.people.doc_ids[self.face_people[identity]]
+
+    def face_match_info(self, identity):
+        """Info dict of a face identity (person details, 'docId', 'type' and 'photos')."""
+        return self.people.info(self.face_people[identity], type="face",
+                                photos=int(self.face_photo_counts[identity]))
+
+    def voice_name(self, row):
+        return self.people.value(self.voice_people[row], "name")
+
+    def voice_match_info(self, row):
+        """Info dict of a voice row (person details, 'docId' and 'type')."""
+        return self.people.info(self.voice_people[row], type="voice")
@@ -0,0 +1,515 @@
+"""
+Gallery indexes for matching face embeddings against the reference gallery.
+
+All indexes work on L2-normalized float32 vectors, so cosine similarity is a
+dot product. ExactGalleryIndex scans every row; IVFFlatGalleryIndex clusters
+the gallery with k-means and only scans the clusters closest to each query,
+trading a little recall (tunable with nprobe) for much lower latency on large
+galleries.
+VoiceGallery is an exact index for the voice gallery that also answers
+threshold queries, since one audio window can match several speakers.
+"""
+import numpy as np
+
+
+# Galleries smaller than this are always searched exactly when kind='auto'. Below it,
+# one matrix product over the whole gallery is about as fast as probing IVF lists
+# and loses no recall.
+IVF_MIN_GALLERY_SIZE = 10000
+
+# Rows per block when scoring many vectors against the centroids
+_ASSIGN_BLOCK_ROWS = 4096
+
+# An updated gallery keeps the previous IVF centroids until its size has grown
+# or shrunk by this factor since they were trained; then they are retrained
+IVF_RETRAIN_FACTOR = 2.0
+
+
+def build_normalized_gallery(embeddings):
+    """
+    Stack embeddings into a C-contiguous float32 matrix with L2-normalized rows.
+
+    Normalizing once at load time turns cosine similarity against the gallery
+    into a plain matrix product.
+
+    Returns:
+        (N, D) float32 array, or None if there are no embeddings
+    """
+    if len(embeddings) == 0:
+        return None
+
+    gallery = np.array(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(gallery, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    gallery /= norms
+    return np.ascontiguousarray(gallery)
+
+
+def top_k_similarities(similarities, k):
+    """
+    Select the k highest scores in every row of a similarity matrix.
+
+    Args:
+        similarities: (N, M) similarity matrix
+        k: Number of candidates to keep per row (capped at M)
+
+    Returns:
+        scores: (N, k) best scores per row, highest first
+        indices: (N, k) column indices of those scores
+    """
+    num_rows, num_cols = similarities.shape
+    k = min(k, num_cols)
+    if k < num_cols:
+        indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(num_cols), (num_rows, num_cols))
+    scores = np.take_along_axis(similarities, indices, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class GalleryIndex:
+    """Base class for nearest-neighbour search over a normalized gallery."""
+
+    kind = None
+
+    def __init__(self, vectors):
+        """
+        Args:
+            vectors: (N, D) L2-normalized float32 gallery matrix
+        """
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k):
+        """
+        Find the k most similar gallery rows for every query.
+
+        Args:
+            queries: (Q, D) L2-normalized float32 query matrix
+            k: Number of results per query
+
+        Returns:
+            scores: (Q, k) cosine similarities, best first (-1.0 for padding)
+            indices: (Q, k) gallery row indices (-1 for padding)
+        """
+        raise NotImplementedError
+
+
+class ExactGalleryIndex(GalleryIndex):
+    """Brute-force search: one matrix product against the whole gallery."""
+
+    kind = 'exact'
+
+    def search(self, queries, k):
+        similarities = queries @ self.vectors.T
+        scores, indices = top_k_similarities(similarities, k)
+        if scores.shape[1] < k:
+            missing = k - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-1.0)
+            indices = np.pad(indices, ((0, 0), (0, missing)), constant_values=-1)
+        return scores, indices
+
+
+class IVFFlatGalleryIndex(GalleryIndex):
+    """
+    Inverted-file index with uncompressed vectors (IVF-flat).
+
+    The gallery is partitioned into nlist clusters with spherical k-means and
+    stored cluster by cluster. A query is compared with the centroids first
+    and then only with the rows of its nprobe closest clusters. Raising
+    nprobe increases recall at the cost of latency; nprobe == nlist is exact.
+
+    An updated gallery can reuse the trained centroids (and the list of every
+    row it still contains) of the previous index, see create_gallery_index.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, vectors, nlist=None, nprobe=8, train_iterations=10, seed=0,
+                 centroids=None, assignments=None, trained_size=None):
+        """
+        Args:
+            vectors: (N, D) L2-normalized float32 gallery matrix
+            nlist: Number of clusters (defaults to ~4 * sqrt(N)); ignored with centroids
+            nprobe: Number of clusters scanned per query (recall/latency knob)
+            train_iterations: k-means iterations used to place the centroids
+            seed: Random seed for centroid initialization
+            centroids: (nlist, D) already trained centroids to use instead of training
+            assignments: (N,) known cluster of every row (-1 = assign it here); only
+                         valid together with the centroids they were assigned with
+            trained_size: Gallery size the given centroids were trained on
+        """
+        super().__init__(vectors)
+        num_vectors = len(vectors)
+        if centroids is not None:
+            self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+            self.nlist = len(self.centroids)
+            self.trained_size = trained_size or num_vectors
+        else:
+            if nlist is None:
+                nlist = int(round(4 * np.sqrt(num_vectors)))
+            self.nlist = int(np.clip(nlist, 1, max(1, num_vectors)))
+            rng = np.random.default_rng(seed)
+            self.centroids = self._train_centroids(vectors, train_iterations, rng)
+            self.trained_size = num_vectors
+        self.nprobe = int(np.clip(nprobe, 1, self.nlist))
+
+        # Only rows without a known cluster are scored against the centroids
+        if assignments is None:
+            assignments = self._assign(vectors)
+        else:
+            assignments = np.array(assignments, dtype=np.int64)
+            unassigned = np.nonzero(assignments < 0)[0]
+            if len(unassigned):
+                assignments[unassigned] = self._assign(vectors[unassigned])
+        self.assignments = assignments
+
+        # Store rows grouped by cluster so each inverted list is one contiguous slice
+        self._row_ids = np.argsort(assignments, kind='stable')
+        self._list_vectors = np.ascontiguousarray(vectors[self._row_ids])
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def _assign(self, vectors):
+        """Return the closest centroid for every row, scoring in blocks to bound memory."""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _ASSIGN_BLOCK_ROWS):
+            block = vectors[start:start + _ASSIGN_BLOCK_ROWS]
+            assignments[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def _train_centroids(self, vectors, iterations, rng):
+        """Place nlist unit-length centroids with spherical k-means on a sample of the gallery."""
+        sample_size = min(len(vectors), self.nlist * 32)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        self.centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = self._assign(sample)
+            order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=self.nlist)
+
+            sums = np.zeros_like(self.centroids)
+            occupied = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+            sums[occupied] = np.add.reduceat(sample[order], starts, axis=0)
+
+            # Re-seed empty clusters from random sample rows
+            num_empty = int((~occupied).sum())
+            if num_empty:
+                sums[~occupied] = sample[rng.choice(sample_size, num_empty, replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.centroids = (sums / norms).astype(np.float32)
+
+        return np.ascontiguousarray(self.centroids)
+
+    def search(self, queries, k):
+        num_queries = len(queries)
+        coarse = queries @ self.centroids.T
+        _, probes = top_k_similarities(coarse, self.nprobe)
+
+        # Every query's probed lists as one row of a padded (Q, L) table of list
+        # positions, so all queries are scored with one batched product
+        starts = self._list_offsets[probes]
+        sizes = self._list_offsets[probes + 1] - starts
+        totals = sizes.sum(axis=1)
+        width = max(int(totals.max(initial=0)), 1)
+        valid = np.arange(width) < totals[:, np.newaxis]
+        flat_starts, flat_sizes = starts.ravel(), sizes.ravel()
+        rows = np.zeros((num_queries, width), dtype=np.int64)
+        rows[valid] = np.arange(flat_sizes.sum()) + np.repeat(flat_starts - (np.cumsum(flat_sizes) - flat_sizes),
+                                                               flat_sizes)
+        similarities = np.matmul(self._list_vectors[rows], queries[:, :, np.newaxis])[:, :, 0]
+        similarities[~valid] = -np.inf
+
+        scores, best = top_k_similarities(similarities, k)
+        indices = self._row_ids[np.take_along_axis(rows, best, axis=1)]
+        # Fewer than k rows in a query's probed lists: the rest is padding
+        unscored = ~np.isfinite(scores)
+        scores[unscored] = -1.0
+        indices[unscored] = -1
+        if scores.shape[1] < k:
+            missing = k - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-1.0)
+            indices = np.pad(indices, ((0, 0), (0, missing)), constant_values=-1)
+        return scores.astype(np.float32), indices.astype(np.int64)
+
+
+IDENTITY_AGGREGATIONS = ('max', 'mean_top_n', 'centroid')
+
+# Row candidates fetched per wanted identity when an approximate index picks
+# the identities to rescore
+_IDENTITY_CANDIDATE_FACTOR = 4
+
+
+class IdentityGallery:
+    """
+    Face gallery grouped by person.
+
+    The rows of every identity (one per photo) are stored as one contiguous
+    block, and a query gets one aggregated score per identity instead of one
+    per photo:
+
+        'max'         best-matching photo
+        'mean_top_n'  mean of the identity's top_n best-matching photos, so one
+                      lucky photo counts less than several consistent ones
+        'centroid'    similarity to the normalized mean of the identity's
+                      photos; only one vector per person is compared
+    """
+
+    def __init__(self, vectors, row_identities, aggregation='max', top_n=3, index_kind='auto', nprobe=8,
+                 previous=None, previous_rows=None):
+        """
+        Args:
+            vectors: (N, D) L2-normalized float32 row matrix
+            row_identities: (N,) identity number (0..K-1) of every row; every
+                            identity must have at least one row
+            aggregation: How photo scores combine into the identity score (IDENTITY_AGGREGATIONS)
+            top_n: Photos averaged per identity with 'mean_top_n'
+            index_kind: Index backend for create_gallery_index ('exact', 'ivf' or 'auto')
+            nprobe: IVF clusters scanned per query
+            previous: IdentityGallery this one updates (its IVF centroids are reused)
+            previous_rows: (N,) row of every vector in previous's input (-1 = new row)
+        """
+        if aggregation not in IDENTITY_AGGREGATIONS:
+            raise ValueError(f"Unknown identity aggregation: {aggregation}")
+        self.aggregation = aggregation
+        self.top_n = max(1, int(top_n))
+
+        row_identities = np.asarray(row_identities, dtype=np.intp)
+        order = np.argsort(row_identities, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            vectors = np.ascontiguousarray(vectors[order])
+            row_identities = row_identities[order]
+        self.vectors = vectors
+        self.row_identities = row_identities
+        # Stored position of every input row
+        self._positions = np.empty(len(order), dtype=np.int64)
+        self._positions[order] = np.arange(len(order))
+
+        # Block i holds rows offsets[i]:offsets[i + 1]
+        self.sizes = np.bincount(row_identities)
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)))
+        # (K, S) row numbers of every block, padded with -1 to the largest block
+        positions = np.arange(self.sizes.max(initial=0))
+        self._block_rows = np.where(positions < self.sizes[:, None], self.offsets[:-1, None] + positions, -1)
+        # Identities with more than top_n photos, the only ones 'mean_top_n' must rank photos
+        # for, grouped by photo count so no block is padded: [(identities, (n, size) rows)]
+        self._ranked_groups = []
+        for size in np.unique(self.sizes[self.sizes > self.top_n]):
+            identities = np.nonzero(self.sizes == size)[0]
+            self._ranked_groups.append((identities, self.offsets[identities, None] + np.arange(size)))
+
+        previous_index = previous.index if previous is not None and previous.aggregation == aggregation else None
+        if aggregation == 'centroid':
+            centroids = np.add.reduceat(vectors, self.offsets[:-1], axis=0)
+            self.centroids = build_normalized_gallery(centroids)
+            # Identity centroids move whenever a person's photos change, so all are reassigned
+            self.index = create_gallery_index(self.centroids, kind=index_kind, nprobe=nprobe, previous=previous_index)
+        else:
+            self.centroids = None
+            index_previous_rows = None
+            if previous_index is not None and previous_rows is not None:
+                # Map each stored row to its stored position in the previous gallery
+                previous_rows = np.asarray(previous_rows, dtype=np.int64)[order]
+                index_previous_rows = np.where(previous_rows >= 0,
+                                               previous._positions[np.maximum(previous_rows, 0)], -1)
+            self.index = create_gallery_index(vectors, kind=index_kind, nprobe=nprobe,
+                                              previous=previous_index, previous_rows=index_previous_rows)
+
+    @property
+    def kind(self):
+        return f"{self.index.kind} ({self.aggregation})"
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def _aggregate_blocks(self, similarities, valid):
+        """
+        Combine photo similarities into identity scores.
+
+        Args:
+            similarities: (..., S) similarities laid out like _block_rows
+            valid: (..., S) mask of the entries that are real rows (not padding)
+
+        Returns:
+            (...) identity scores
+        """
+        similarities = np.where(valid, similarities, -np.inf)
+        if self.aggregation == 'max' or similarities.shape[-1] == 1:
+            return similarities.max(axis=-1)
+
+        # mean_top_n: mean of the (up to) top_n real scores of every block
+        n = min(self.top_n, similarities.shape[-1])
+        top = -np.partition(-similarities, n - 1, axis=-1)[..., :n]
+        counts = np.minimum(valid.sum(axis=-1), n)
+        return (np.where(np.isfinite(top), top, 0.0).sum(axis=-1) / counts).astype(np.float32)
+
+    def search(self, queries, k):
+        """
+        Find the k most similar identities for every query.
+
+        Args:
+            queries: (Q, D) L2-normalized float32 query matrix
+            k: Number of identities per query
+
+        Returns:
+            scores: (Q, k) aggregated similarities, best first (-1.0 for padding)
+            identities: (Q, k) identity numbers (-1 for padding)
+        """
+        if self.aggregation == 'centroid':
+            return self.index.search(queries, k)
+
+        if self.index.kind == 'exact':
+            # Blocks are contiguous, so identity scores reduce directly over the row offsets
+            similarities = queries @ self.vectors.T
+            starts = self.offsets[:-1]
+            if self.aggregation == 'max':
+                scores = np.maximum.reduceat(similarities, starts, axis=1)
+            else:
+                # Identities with at most top_n photos average all of them; larger
+                # blocks rank their photos, one group of equally sized blocks at a time
+                scores = (np.add.reduceat(similarities, starts, axis=1) / self.sizes).astype(np.float32)
+                for identities, block_rows in self._ranked_groups:
+                    group = similarities[:, block_rows]
+                    scores[:, identities] = self._aggregate_blocks(group, np.ones(group.shape, dtype=bool))
+        else:
+            # The approximate index nominates identities; their photos are then scored exactly
+            _, rows = self.index.search(queries, k * max(self.top_n, 1) * _IDENTITY_CANDIDATE_FACTOR)
+            scores = np.full((len(queries), len(self)), -np.inf, dtype=np.float32)
+            for q, query_rows in enumerate(rows):
+                candidates = np.unique(self.row_identities[query_rows[query_rows >= 0]])
+                if len(candidates) == 0:
+                    continue
+                block_rows = self._block_rows[candidates]
+                similarities = np.full(block_rows.shape, -np.inf, dtype=np.float32)
+                valid = block_rows >= 0
+                similarities[valid] = self.vectors[block_rows[valid]] @ queries[q]
+                scores[q, candidates] = self._aggregate_blocks(similarities, valid)
+
+        top_scores, identities = top_k_similarities(scores, k)
+        # Identities the approximate index did not nominate are padding
+        unscored = ~np.isfinite(top_scores)
+        top_scores[unscored] = -1.0
+        identities[unscored] = -1
+        if top_scores.shape[1] < k:
+            missing = k - top_scores.shape[1]
+            top_scores = np.pad(top_scores, ((0, 0), (0, missing)), constant_values=-1.0)
+            identities = np.pad(identities, ((0, 0), (0, missing)), constant_values=-1)
+        return top_scores, identities
+
+
+class VoiceGallery(ExactGalleryIndex):
+    """
+    Exact index over the voice gallery with threshold queries.
+
+    Several people can speak in one audio window, so voice matching asks for
+    every row above a threshold rather than a fixed k. Results are returned as
+    compact score/index arrays; callers look up names only for the few rows
+    that matched.
+    """
+
+    kind = 'voice'
+
+    def __init__(self, vectors):
+        """
+        Args:
+            vectors: (N, D) voice embedding matrix (normalized here if it is not already)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        if not np.allclose(norms, 1.0, atol=1e-3):
+            vectors = build_normalized_gallery(vectors)
+        super().__init__(np.ascontiguousarray(vectors))
+
+    def similarities(self, query):
+        """
+        Cosine similarity of one embedding against every row.
+
+        Returns:
+            (N,) float32 similarities, or None if the query is a zero vector
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        return self.vectors @ (query / norm)
+
+    def best(self, query):
+        """
+        Returns:
+            (similarity, index) of the closest row, or (0.0, None) for a zero query
+        """
+        similarities = self.similarities(query)
+        if similarities is None:
+            return 0.0, None
+        index = int(np.argmax(similarities))
+        return float(similarities[index]), index
+
+    def above(self, query, threshold, max_results=None):
+        """
+        Find every row more similar than threshold.
+
+        Args:
+            query: (D,) embedding
+            threshold: Minimum cosine similarity (exclusive)
+            max_results: Keep only this many of the best rows (None = all)
+
+        Returns:
+            scores: (R,) similarities, best first
+            indices: (R,) row indices of those similarities
+        """
+        similarities = self.similarities(query)
+        if similarities is None:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.intp)
+
+        indices = np.nonzero(similarities > threshold)[0]
+        scores = similarities[indices]
+        if max_results is not None and len(indices) > max_results:
+            keep = np.argpartition(-scores, max_results - 1)[:max_results]
+            indices, scores = indices[keep], scores[keep]
+        order = np.argsort(-scores)
+        return scores[order], indices[order]
+
+
+def create_gallery_index(vectors, kind='auto', nprobe=8, nlist=None, previous=None, previous_rows=None):
+    """
+    Build a gallery index for a normalized embedding matrix.
+
+    Args:
+        vectors: (N, D) L2-normalized float32 gallery matrix, or None if empty
+        kind: 'exact', 'ivf', or 'auto' (IVF once the gallery reaches IVF_MIN_GALLERY_SIZE rows)
+        nprobe: Clusters scanned per query for the IVF index
+        nlist: Number of IVF clusters (defaults to ~4 * sqrt(N))
+        previous: Index of the gallery this one updates; an IVF index reuses its
+                  centroids unless the size drifted by IVF_RETRAIN_FACTOR
+        previous_rows: (N,) row of every vector in previous (-1 = new row), so
+                       unchanged rows keep their inverted list without being reassigned
+
+    Returns:
+        GalleryIndex instance, or None if the gallery is empty
+    """
+    if vectors is None or len(vectors) == 0:
+        return None
+
+    if kind == 'auto':
+        kind = 'ivf' if len(vectors) >= IVF_MIN_GALLERY_SIZE else 'exact'
+
+    if kind == 'exact':
+        return ExactGalleryIndex(vectors)
+    if kind == 'ivf':
+        if isinstance(previous, IVFFlatGalleryIndex) and nlist in (None, previous.nlist) and \
+           previous.trained_size / IVF_RETRAIN_FACTOR <= len(vectors) <= previous.trained_size * IVF_RETRAIN_FACTOR:
+            assignments = None
+            if previous_rows is not None:
+                previous_rows = np.asarray(previous_rows, dtype=np.int64)
+                assignments = np.where(previous_rows >= 0, previous.assignments[np.maximum(previous_rows, 0)], -1)
+            return IVFFlatGalleryIndex(vectors, nprobe=nprobe, centroids=previous.centroids,
+                                       assignments=assignments, trained_size=previous.trained_size)
+        return IVFFlatGalleryIndex(vectors, nlist=nlist, nprobe=nprobe)
+    raise ValueError(f"Unknown gallery index kind: {kind}")
@@ -0,0 +1,383 @@
+"""
+Local on-disk snapshot of the face and voice galleries.
+
+A snapshot directory holds:
+    face_embeddings.<generation>.npy   (N, 512) L2-normalized float32 face matrix
+    voice_embeddings.<generation>.npy  (M, 256) L2-normalized float32 voice matrix
+    metadata.json                      format version, sync cursor, the current
+                                       matrix file names and a compact metadata
+                                       table (one entry per person, plus the
+                                       document ID of every face/voice row)
+
+The .npy files are memory-mapped on load, so a warm start does not parse or
+copy the gallery. Only documents updated after the snapshot's sync cursor
+need to be fetched from Firestore and merged in.
+"""
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from gallery_index import build_normalized_gallery
+from person_table import PersonTable
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+FACE_EMBEDDINGS_PREFIX = "face_embeddings"
+VOICE_EMBEDDINGS_PREFIX = "voice_embeddings"
+METADATA_FILE = "metadata.json"
+
+# Fields of an 'upload' document the gallery needs. Gallery queries select only
+# these, so media fields (like the base64 'images'/'audio' of older documents)
+# are never transferred.
+GALLERY_FIELDS = [
+    "fullName",
+    "age",
+    "cityLastSeen",
+    "dateLastSeen",
+    "contactPhone",
+    "imageMetadata",
+    "audioMetadata",
+    "updatedAt",
+]
+
+
+# Binary embedding format written by the backend: a 4-byte header (magic,
+# format version, dtype code, reserved) followed by the little-endian vector.
+# decode_embedding and these constants mirror backend/embedding_codec.py (the
+# detector is deployed without the backend package); change both together and
+# keep EMBEDDING_FORMAT_VERSION equal. Newer versions are skipped, not decoded.
+EMBEDDING_MAGIC = b"E"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER_SIZE = 4
+_EMBEDDING_DTYPES = {
+    b"f": np.dtype("<f4"),
+    b"e": np.dtype("<f2"),
+}
+
+
+def decode_embedding(value):
+    """
+    Decode an embedding field from an 'upload' document.
+
+    Accepts the binary format (decoded zero-copy with np.frombuffer for
+    float32 data) and the legacy JSON float list.
+
+    Returns:
+        1-D float32 array, or None if value is None
+    """
+    if value is None:
+        return None
+
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return np.asarray(value, dtype=np.float32)
+
+    header = bytes(value[:EMBEDDING_HEADER_SIZE])
+    if len(header) < EMBEDDING_HEADER_SIZE or header[:1] != EMBEDDING_MAGIC:
+        raise ValueError("Not an encoded embedding")
+    if header[1] != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version: {header[1]}")
+
+    dtype = _EMBEDDING_DTYPES.get(header[2:3])
+    if dtype is None:
+        raise ValueError(f"Unsupported embedding dtype code: {header[2:3]!r}")
+
+    vector = np.frombuffer(value, dtype=dtype, offset=EMBEDDING_HEADER_SIZE)
+    if vector.dtype != np.float32:
+        vector = vector.astype(np.float32)
+    return vector
+
+
+def _decode_document_embedding(value, doc_id, label):
+    """Decode one embedding of a document, or log and return None if it cannot be decoded."""
+    try:
+        return decode_embedding(value)
+    except (ValueError, TypeError) as e:
+        print(f"⚠️  Skipping {label} embedding of document {doc_id}: {e}")
+        return None
+
+
+def parse_upload_document(doc_data, doc_id=None):
+    """
+    Extract person details and embeddings from one 'upload' document.
+
+    Embeddings that cannot be decoded (malformed, or written in a newer format)
+    are logged and skipped, so one bad document does not fail a whole sync.
+
+    Args:
+        doc_data: Document fields
+        doc_id: Document ID, used in log messages
+
+    Returns:
+        dict with 'person' (name/age/city/dateSeen/contact), 'faces'
+        (list of (image_index, float32 embedding)), 'voice' (float32
+        embedding or None) and 'updatedAt'
+    """
+    person = {
+        "name": doc_data.get("fullName", "Unknown"),
+        "age": doc_data.get("age", "N/A"),
+        "city": doc_data.get("cityLastSeen", "N/A"),
+        "dateSeen": doc_data.get("dateLastSeen", "N/A"),
+        "contact": doc_data.get("contactPhone", "N/A"),
+    }
+
+    faces = []
+    for img_meta in doc_data.get("imageMetadata", []):
+        if img_meta.get("has_face", False) and img_meta.get("embedding") is not None:
+            embedding = _decode_document_embedding(img_meta.get("embedding"), doc_id, "face")
+            if embedding is not None:
+                faces.append((img_meta.get("index", 0), embedding))
+
+    voice = None
+    audio_metadata = doc_data.get("audioMetadata")
+    if audio_metadata and audio_metadata.get("has_voice", False) and audio_metadata.get("embedding") is not None:
+        voice = _decode_document_embedding(audio_metadata.get("embedding"), doc_id, "voice")
+
+    return {"person": person, "faces": faces, "voice": voice, "updatedAt": doc_data.get("updatedAt")}
+
+
+def _stack_rows(kept, new_rows):
+    """Concatenate kept snapshot rows with newly normalized rows."""
+    new_matrix = build_normalized_gallery(new_rows)
+    if new_matrix is None:
+        return kept
+    if len(kept) == 0:
+        return new_matrix
+    return np.ascontiguousarray(np.concatenate([kept, new_matrix]))
+
+
+# Identifies snapshot objects, so a gallery can tell whether a snapshot was merged from its own
+_snapshot_generations = itertools.count()
+
+
+class GallerySnapshot:
+    """
+    Face and voice gallery rows plus per-person metadata, keyed by document ID.
+
+    Person details are kept in a PersonTable (shared with the Gallery built
+    from the snapshot) and every face/voice row holds only an int32 person
+    row. Document ID lists and the details dict are rebuilt on demand when
+    merging or saving.
+    """
+
+    def __init__(self, face_embeddings, face_doc_ids, face_image_indices,
+                 voice_embeddings, voice_doc_ids, people, synced_at=None):
+        """
+        Args:
+            face_embeddings: (N, D) normalized float32 face matrix
+            face_doc_ids: Document ID of every face row
+            face_image_indices: Image index (within its document) of every face row
+            voice_embeddings: (M, D) normalized float32 voice matrix
+            voice_doc_ids: Document ID of every voice row
+            people: {doc_id: person details} for every document with embeddings
+            synced_at: Latest 'updatedAt' covered by this snapshot (aware datetime)
+        """
+        self.face_embeddings = face_embeddings
+        self.people = PersonTable(people)
+        # Row document IDs repeat per photo; rows refer to the person table instead
+        self.face_rows = self.people.rows(face_doc_ids)
+        self.face_image_indices = np.asarray(face_image_indices, dtype=np.int32)
+        self.voice_embeddings = voice_embeddings
+        self.voice_rows = self.people.rows(voice_doc_ids)
+        self.synced_at = synced_at
+
+        self.generation = next(_snapshot_generations)
+        # Set by merge(): the generation of the snapshot this one was merged from, and the
+        # row of every face row in it (-1 for added rows), so indexes can be updated in place
+        self.parent_generation = None
+        self.parent_face_rows = None
+
+    @property
+    def face_doc_ids(self):
+        """Document ID of every face row."""
+        return [self.people.doc_ids[row] for row in self.face_rows]
+
+    @property
+    def voice_doc_ids(self):
+        """Document ID of every voice row."""
+        return [self.people.doc_ids[row] for row in self.voice_rows]
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 0), dtype=np.float32), [], [],
+                   np.zeros((0, 0), dtype=np.float32), [], {})
+
+    @classmethod
+    def from_documents(cls, documents, synced_at=None):
+        """
+        Build a snapshot from parsed documents.
+
+        Args:
+            documents: {doc_id: parse_upload_document(...) result}
+            synced_at: Latest 'updatedAt' among the documents
+        """
+        return cls.empty().merge(documents, synced_at=synced_at)
+
+    def filter_changes(self, documents):
+        """
+        Drop documents that would not change this snapshot.
+
+        Incremental queries use 'updatedAt >= synced_at', so the documents at
+        the cursor itself come back on every poll; they are skipped when this
+        snapshot already covers them.
+        """
+        changed = {}
+        for doc_id, document in documents.items():
+            updated_at = document.get("updatedAt")
+            already_covered = self.synced_at is not None and updated_at is not None and updated_at <= self.synced_at
+            has_embeddings = bool(document["faces"]) or document["voice"] is not None
+            if already_covered and (doc_id in self.people or not has_embeddings):
+                continue
+            changed[doc_id] = document
+        return changed
+
+    def merge(self, documents, deleted_doc_ids=(), synced_at=None):
+        """
+        Return a new snapshot with documents added or replaced and deleted documents removed.
+
+        Args:
+            documents: {doc_id: parse_upload_document(...) result} for added/updated documents
+            deleted_doc_ids: IDs of documents that no longer exist
+            synced_at: New sync cursor (keeps the current one if None or older)
+        """
+        replaced = set(documents) | set(deleted_doc_ids)
+        replaced_rows = np.array([row for row, doc_id in enumerate(self.people.doc_ids) if doc_id in replaced],
+                                 dtype=np.int32)
+
+        face_keep = ~np.isin(self.face_rows, replaced_rows)
+        voice_keep = ~np.isin(self.voice_rows, replaced_rows)
+
+        doc_ids = self.people.doc_ids
+        face_doc_ids = [doc_ids[row] for row in self.face_rows[face_keep]]
+        face_image_indices = self.face_image_indices[face_keep].tolist()
+        voice_doc_ids = [doc_ids[row] for row in self.voice_rows[voice_keep]]
+        people = {doc_id: self.people.details(row) for row, doc_id in enumerate(doc_ids) if doc_id not in replaced}
+
+        new_faces = []
+        new_voices = []
+        for doc_id, document in documents.items():
+            if not document["faces"] and document["voice"] is None:
+                continue
+            people[doc_id] = document["person"]
+            for image_index, embedding in document["faces"]:
+                new_faces.append(embedding)
+                face_doc_ids.append(doc_id)
+                face_image_indices.append(image_index)
+            if document["voice"] is not None:
+                new_voices.append(document["voice"])
+                voice_doc_ids.append(doc_id)
+
+        face_embeddings = self.face_embeddings
+        if not face_keep.all():
+            face_embeddings = self.face_embeddings[face_keep]
+        voice_embeddings = self.voice_embeddings
+        if not voice_keep.all():
+            voice_embeddings = self.voice_embeddings[voice_keep]
+
+        if synced_at is None or (self.synced_at is not None and synced_at < self.synced_at):
+            synced_at = self.synced_at
+
+        merged = GallerySnapshot(
+            _stack_rows(face_embeddings, new_faces), face_doc_ids, face_image_indices,
+            _stack_rows(voice_embeddings, new_voices), voice_doc_ids, people, synced_at,
+        )
+        merged.parent_generation = self.generation
+        merged.parent_face_rows = np.concatenate([np.nonzero(face_keep)[0], np.full(len(new_faces), -1)])
+        return merged
+
+    def face_identities(self):
+        """
+        Group the face rows by person.
+
+        Returns:
+            identity_people: (I,) int32 person table row of every identity
+            row_identities: (N,) identity number of every face row
+        """
+        identity_people, row_identities = np.unique(self.face_rows, return_inverse=True)
+        return identity_people.astype(np.int32), row_identities.astype(np.intp)
+
+    def save(self, directory):
+        """
+        Write the snapshot atomically.
+
+        Matrices are written under new generation-stamped names and
+        metadata.json (which names them) is replaced last, so a crash at any
+        point leaves either the old or the new snapshot, never a mix.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+
+        files = {}
+        for key, prefix, matrix in (("faceFile", FACE_EMBEDDINGS_PREFIX, self.face_embeddings),
+                                    ("voiceFile", VOICE_EMBEDDINGS_PREFIX, self.voice_embeddings)):
+            filename = f"{prefix}.{generation}.npy"
+            temp_path = directory / (filename + ".tmp")
+            with open(temp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            os.replace(temp_path, directory / filename)
+            files[key] = filename
+
+        metadata = {
+            "formatVersion": SNAPSHOT_FORMAT_VERSION,
+            "savedAt": datetime.now(timezone.utc).isoformat(),
+            "syncedAt": self.synced_at.isoformat() if self.synced_at is not None else None,
+            **files,
+            "people": self.people.to_dict(),
+            "faceDocIds": self.face_doc_ids,
+            "faceImageIndices": self.face_image_indices.tolist(),
+            "voiceDocIds": self.voice_doc_ids,
+        }
+        temp_path = directory / (METADATA_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, default=str)
+        os.replace(temp_path, directory / METADATA_FILE)
+
+        # Remove matrices from older generations
+        for path in directory.glob("*.npy"):
+            if path.name not in files.values():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a snapshot, memory-mapping the embedding matrices.
+
+        Returns:
+            GallerySnapshot, or None if there is no valid snapshot in directory
+        """
+        directory = Path(directory)
+        metadata_path = directory / METADATA_FILE
+        if not metadata_path.exists():
+            return None
+
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            if metadata.get("formatVersion") != SNAPSHOT_FORMAT_VERSION:
+                print(f"⚠️  Ignoring gallery snapshot with unsupported format version {metadata.get('formatVersion')}")
+                return None
+
+            face_embeddings = np.load(directory / metadata["faceFile"], mmap_mode="r")
+            voice_embeddings = np.load(directory / metadata["voiceFile"], mmap_mode="r")
+            if len(face_embeddings) != len(metadata["faceDocIds"]) or \
+               len(voice_embeddings) != len(metadata["voiceDocIds"]):
+                print("⚠️  Ignoring inconsistent gallery snapshot (row counts do not match metadata)")
+                return None
+
+            synced_at = metadata.get("syncedAt")
+            return cls(
+                face_embeddings, metadata["faceDocIds"], metadata["faceImageIndices"],
+                voice_embeddings, metadata["voiceDocIds"], metadata["people"],
+                datetime.fromisoformat(synced_at) if synced_at else None,
+            )
+        except Exception as e:
+            print(f"⚠️  Could not load gallery snapshot from {directory}: {e}")
+            return None
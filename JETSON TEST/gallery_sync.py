@@ -0,0 +1,112 @@
+"""
+Background synchronization of the detector's gallery with Firestore.
+
+GallerySync polls the 'upload' collection for documents whose 'updatedAt' is
+at or after the current snapshot's sync cursor, merges them into a new
+snapshot and publishes it through the detector's atomic gallery swap. Deleted
+documents are found by periodically listing document IDs (a names-only query,
+no document fields are transferred). All network and index-building work runs
+on the sync thread, so frame processing never waits on it.
+"""
+import threading
+import time
+
+from firebase_admin import firestore
+
+
+class GallerySync:
+    def __init__(self, detector, poll_interval=30.0, deletion_check_interval=600.0):
+        """
+        Args:
+            detector: FirebaseFaceDetector whose gallery is kept up to date
+            poll_interval: Seconds between checks for added/updated documents
+                           (None = only sync when request_full_sync() is called)
+            deletion_check_interval: Seconds between checks for deleted documents
+                                     (None = never check for deletions)
+        """
+        self.detector = detector
+        self.poll_interval = poll_interval
+        self.deletion_check_interval = deletion_check_interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._full_sync_requested = False
+        self._last_deletion_check = time.time()
+        self._thread = None
+
+    def start(self):
+        """Start the background sync thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gallery-sync", daemon=True)
+        self._thread.start()
+        if self.poll_interval is not None:
+            print(f"🔄 Gallery sync started (every {self.poll_interval:.0f}s)")
+
+    def stop(self):
+        """Stop the background sync thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def request_full_sync(self):
+        """Ask the sync thread to re-download the whole gallery as soon as possible."""
+        self._full_sync_requested = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            try:
+                if self._full_sync_requested:
+                    self._full_sync_requested = False
+                    self.detector.reload_embeddings_from_firebase()
+                    self._last_deletion_check = time.time()
+                else:
+                    self.sync_once()
+            except Exception as e:
+                print(f"⚠️  Gallery sync failed: {e}")
+
+    def sync_once(self):
+        """
+        Apply added, updated and deleted documents to the gallery.
+
+        Returns:
+            True if the gallery changed
+        """
+        snapshot = self.detector.gallery.snapshot
+        documents, latest_update = self.detector.download_embeddings_from_firebase(
+            updated_since=snapshot.synced_at, verbose=False
+        )
+        if documents is None:
+            return False
+        documents = snapshot.filter_changes(documents)
+
+        deleted_doc_ids = set()
+        if self.deletion_check_interval is not None and \
+           time.time() - self._last_deletion_check >= self.deletion_check_interval:
+            deleted_doc_ids = self._find_deleted_documents(snapshot)
+            self._last_deletion_check = time.time()
+
+        if not documents and not deleted_doc_ids:
+            return False
+
+        updated = snapshot.merge(documents, deleted_doc_ids, synced_at=latest_update)
+        self.detector.apply_gallery(updated)
+        self.detector.save_gallery_snapshot(updated)
+        print(f"🔄 Gallery synced: {len(documents)} updated, {len(deleted_doc_ids)} removed "
+              f"({len(updated.face_rows)} face / {len(updated.voice_rows)} voice embeddings)")
+        return True
+
+    def _find_deleted_documents(self, snapshot):
+        """Return IDs of snapshot documents that no longer exist in Firestore."""
+        query = self.detector.db.collection("upload").select([firestore.FieldPath.document_id()])
+        existing = {doc.id for doc in query.stream()}
+        return {doc_id for doc_id in snapshot.people.doc_ids if doc_id not in existing}
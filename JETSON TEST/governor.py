@@ -0,0 +1,199 @@
+"""
+Runtime quality governor for the detector.
+
+The detector's processing resolution, detector input size (det_size) and
+detection cadence (frame_skip) trade accuracy for speed. PerformanceGovernor
+moves along a ladder of settings, from the configured ones down to cheap
+ones, so that capture-to-decision latency stays within a budget:
+
+    - latency above the budget, or the SoC at its thermal limit
+      -> one step cheaper
+    - latency well under the budget and the SoC cool
+      -> one step back toward the configured quality
+
+Temperatures are read from the CPU/GPU/SoC zones in /sys/class/thermal
+(Linux, including Jetson); where none is available only latency is used. Decisions are made at most
+every adjust_interval seconds and only on samples measured with the current
+settings, so one change can take effect before the next is considered.
+"""
+import glob
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+
+THERMAL_ZONES_GLOB = "/sys/class/thermal/thermal_zone*"
+
+# Zone types (thermal_zone*/type) that reflect the compute load: Jetson CPU/GPU/SoC
+# sensors, Raspberry Pi and x86 package sensors. Board, PMIC and fan estimate zones
+# are left out.
+DEFAULT_THERMAL_ZONE_TYPES = ("CPU-therm", "GPU-therm", "SOC-therm", "SOC0-therm", "SOC1-therm",
+                              "SOC2-therm", "tj-therm", "cpu-thermal", "soc-thermal", "x86_pkg_temp")
+
+# Zones that report a constant value (the Jetson Nano PMIC-Die zone always reads 100 C)
+_IGNORED_THERMAL_ZONE_TYPES = ("PMIC-Die",)
+
+# Latency below this fraction of the budget allows a step back up
+_STEP_UP_FRACTION = 0.6
+
+# Degrees below the thermal limit the SoC must cool to before quality is raised again
+_THERMAL_HYSTERESIS = 5.0
+
+
+def find_thermal_zones(zone_types=DEFAULT_THERMAL_ZONE_TYPES, pattern=THERMAL_ZONES_GLOB):
+    """
+    Return the temp file paths of the thermal zones whose type is in zone_types
+    (case-insensitive; None = every zone), skipping zones known to report a constant value.
+    """
+    wanted = None if zone_types is None else {zone_type.lower() for zone_type in zone_types}
+    ignored = {zone_type.lower() for zone_type in _IGNORED_THERMAL_ZONE_TYPES}
+    paths = []
+    for zone in sorted(glob.glob(pattern)):
+        try:
+            with open(os.path.join(zone, "type"), "r") as f:
+                zone_type = f.read().strip().lower()
+        except OSError:
+            continue
+        if zone_type in ignored or (wanted is not None and zone_type not in wanted):
+            continue
+        paths.append(os.path.join(zone, "temp"))
+    return paths
+
+
+def read_max_temperature(paths):
+    """
+    Return the hottest of the given thermal zone temp files in degrees Celsius, or None if none can be read.
+    """
+    temperatures = []
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                temperatures.append(int(f.read().strip()) / 1000.0)
+        except (OSError, ValueError):
+            continue
+    return max(temperatures) if temperatures else None
+
+
+def build_quality_levels(process_resolution, detection_size, frame_skip,
+                         min_resolution=240, min_detection_size=160, max_extra_skip=3):
+    """
+    Build the ladder of (process_resolution, detection_size, frame_skip) settings.
+
+    Level 0 is the configured quality. Each further level lowers whichever of
+    det_size and resolution is relatively larger; once both are at their
+    minimum, detection runs on fewer frames.
+    """
+    levels = [(process_resolution, detection_size, frame_skip)]
+    resolution, det_size, skip = levels[0]
+    while True:
+        can_shrink_det = det_size > min_detection_size
+        can_shrink_resolution = resolution > min_resolution
+        if can_shrink_det and (not can_shrink_resolution or
+                               det_size / detection_size >= resolution / process_resolution):
+            det_size = max(min_detection_size, det_size - 64)
+        elif can_shrink_resolution:
+            resolution = int(resolution * 0.8)
+            if resolution < min_resolution * 1.1:
+                resolution = min_resolution
+        elif skip < frame_skip + max_extra_skip:
+            skip += 1
+        else:
+            return levels
+        levels.append((resolution, det_size, skip))
+
+
+class PerformanceGovernor:
+    def __init__(self, process_resolution, detection_size, frame_skip, target_latency=0.25,
+                 thermal_limit=80.0, adjust_interval=2.0, min_samples=5,
+                 thermal_zone_types=DEFAULT_THERMAL_ZONE_TYPES, thermal_zones=THERMAL_ZONES_GLOB):
+        """
+        Args:
+            process_resolution: Configured (best) processing resolution
+            detection_size: Configured (best) detector input size
+            frame_skip: Configured (best) frame skip
+            target_latency: Latency budget in seconds (90th percentile of recorded latencies)
+            thermal_limit: Temperature in degrees Celsius at which quality is lowered
+                           regardless of latency (None = ignore temperature)
+            adjust_interval: Minimum seconds between two changes
+            min_samples: Latencies needed with the current settings before deciding
+            thermal_zone_types: Types (thermal_zone*/type) of the zones to watch
+                                (None = all zones except ones known to read constant values)
+            thermal_zones: Glob of the thermal zone directories
+        """
+        self.levels = build_quality_levels(process_resolution, detection_size, frame_skip)
+        self.level = 0
+        self.target_latency = target_latency
+        self.thermal_limit = thermal_limit
+        self.adjust_interval = adjust_interval
+        self.min_samples = min_samples
+        self.thermal_zones = find_thermal_zones(thermal_zone_types, thermal_zones) if thermal_limit is not None else []
+        if thermal_limit is not None and not self.thermal_zones and os.name == "posix":
+            print("⚠️  No CPU/GPU/SoC thermal zones found; the governor will only watch latency")
+
+        self.latencies = deque(maxlen=60)
+        self.stage_times = {}  # {stage name: deque of durations}
+        self.temperature = None
+        self._last_change = time.time()
+
+    @property
+    def settings(self):
+        """Current (process_resolution, detection_size, frame_skip)."""
+        return self.levels[self.level]
+
+    def record(self, latency, stage_times=None):
+        """
+        Record the capture-to-decision latency of one inference, plus optional per-stage durations.
+        """
+        self.latencies.append(latency)
+        for stage, duration in (stage_times or {}).items():
+            self.stage_times.setdefault(stage, deque(maxlen=60)).append(duration)
+
+    def update(self, now=None):
+        """
+        Re-evaluate the quality level.
+
+        Returns:
+            True if the level changed (read the new values from settings)
+        """
+        now = time.time() if now is None else now
+        if now - self._last_change < self.adjust_interval or len(self.latencies) < self.min_samples:
+            return False
+
+        if self.thermal_limit is not None:
+            self.temperature = read_max_temperature(self.thermal_zones)
+        hot = self.temperature is not None and self.temperature >= self.thermal_limit
+        cool = self.temperature is None or self.temperature < self.thermal_limit - _THERMAL_HYSTERESIS
+        latency = float(np.percentile(self.latencies, 90))
+
+        level = self.level
+        if (hot or latency > self.target_latency) and level < len(self.levels) - 1:
+            level += 1
+        elif cool and latency < _STEP_UP_FRACTION * self.target_latency and level > 0:
+            level -= 1
+        if level == self.level:
+            return False
+
+        self.level = level
+        self._last_change = now
+        # Judge the new settings on their own measurements
+        self.latencies.clear()
+        for durations in self.stage_times.values():
+            durations.clear()
+        return True
+
+    def status_lines(self):
+        """Return the (text, color) status panel lines for the governor."""
+        resolution, det_size, skip = self.settings
+        color = (0, 255, 0) if self.level == 0 else (0, 165, 255)
+        lines = [(f"Quality {self.level}/{len(self.levels) - 1}: {resolution}p det {det_size} skip {skip}", color)]
+        # Copy the samples first: the inference thread may clear them meanwhile
+        stage_samples = [(stage, list(durations)) for stage, durations in list(self.stage_times.items())]
+        timings = " | ".join(f"{stage} {np.mean(samples) * 1000:.0f} ms" for stage, samples in stage_samples if samples)
+        if timings:
+            lines.append((timings, (255, 255, 255)))
+        if self.temperature is not None:
+            lines.append((f"SoC: {self.temperature:.0f} C", (0, 0, 255) if self.temperature >= self.thermal_limit
+                          else (255, 255, 255)))
+        return lines
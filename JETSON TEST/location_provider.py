@@ -0,0 +1,281 @@
+"""
+Location of the detector's cameras for alerts.
+
+get_location() never touches the network, so it can be called from the frame
+loop. Sources, in order of preference:
+
+    1. A static location configured for the camera (fixed installations)
+    2. The latest fix from a GPS receiver on a serial port (NMEA GGA/RMC)
+    3. An IP geolocation lookup, cached for ttl seconds and refreshed in the
+       background
+
+The last good position is saved to disk, so a device that starts offline
+still reports where it was last seen.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+try:
+    import serial
+except ImportError:
+    # pyserial not installed, GPS is unavailable
+    serial = None
+
+
+IP_LOOKUP_URL = 'http://ip-api.com/json/'
+
+# A GPS fix older than this is ignored
+GPS_FIX_MAX_AGE = 30.0
+
+
+def unavailable_location():
+    return {
+        'latitude': 0.0,
+        'longitude': 0.0,
+        'address': 'Location unavailable',
+        'city': 'Unknown',
+        'country': 'Unknown',
+        'zip': 'Unknown',
+        'source': 'unavailable',
+    }
+
+
+def _nmea_checksum_ok(sentence):
+    if '*' not in sentence:
+        return True
+    body, checksum = sentence[1:].split('*', 1)
+    calculated = 0
+    for char in body:
+        calculated ^= ord(char)
+    try:
+        return calculated == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+
+def _nmea_coordinate(value, hemisphere):
+    """Convert an NMEA ddmm.mmmm / dddmm.mmmm value to signed decimal degrees."""
+    if not value or not hemisphere:
+        return None
+    degrees_length = 2 if hemisphere in ('N', 'S') else 3
+    degrees = float(value[:degrees_length]) + float(value[degrees_length:]) / 60.0
+    return -degrees if hemisphere in ('S', 'W') else degrees
+
+
+def parse_nmea_sentence(sentence):
+    """
+    Extract a position fix from an NMEA GGA or RMC sentence.
+
+    Returns:
+        (latitude, longitude), or None if the sentence is not a valid fix
+    """
+    sentence = sentence.strip()
+    if not sentence.startswith('$') or not _nmea_checksum_ok(sentence):
+        return None
+
+    fields = sentence.split('*', 1)[0].split(',')
+    sentence_type = fields[0][3:]
+    try:
+        if sentence_type == 'GGA' and len(fields) > 6 and fields[6] not in ('', '0'):
+            latitude = _nmea_coordinate(fields[2], fields[3])
+            longitude = _nmea_coordinate(fields[4], fields[5])
+        elif sentence_type == 'RMC' and len(fields) > 6 and fields[2] == 'A':
+            latitude = _nmea_coordinate(fields[3], fields[4])
+            longitude = _nmea_coordinate(fields[5], fields[6])
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if latitude is None or longitude is None:
+        return None
+    return latitude, longitude
+
+
+class LocationProvider:
+    def __init__(self, camera_locations=None, gps_port=None, gps_baudrate=9600,
+                 ttl=3600.0, cache_path='location_cache.json', lookup_url=IP_LOOKUP_URL,
+                 lookup_timeout=5.0, retry_interval=60.0):
+        """
+        Args:
+            camera_locations: Static location for every camera (a location dict with at
+                              least 'latitude' and 'longitude'), or {stream_id: location dict}
+                              for per-camera locations (keys are camera positions in the
+                              run() source list or stream IDs; '*' = all other cameras)
+            gps_port: Serial port of an NMEA GPS receiver (e.g. '/dev/ttyUSB0'); needs pyserial
+            gps_baudrate: Baud rate of the GPS receiver
+            ttl: Seconds before the IP geolocation result is refreshed
+            cache_path: JSON file keeping the last good position (None = memory only)
+            lookup_url: IP geolocation service (ip-api.com response format)
+            lookup_timeout: Timeout in seconds for one IP lookup
+            retry_interval: Seconds between IP lookups while they are failing
+        """
+        if camera_locations and 'latitude' in camera_locations:
+            camera_locations = {'*': camera_locations}
+        # Camera indices as passed to run() map to stream IDs 'cam0', 'cam1', ...
+        self.camera_locations = {
+            (f"cam{key}" if isinstance(key, int) else key): {
+                **unavailable_location(), 'address': 'Fixed camera location', **location, 'source': 'static'
+            }
+            for key, location in (camera_locations or {}).items()
+        }
+        self.gps_port = gps_port
+        self.gps_baudrate = gps_baudrate
+        self.ttl = ttl
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.lookup_url = lookup_url
+        self.lookup_timeout = lookup_timeout
+        self.retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._ip_location = None
+        self._ip_location_time = 0.0
+        self._gps_location = None
+        self._gps_location_time = 0.0
+        self._last_good = self._load_cache()
+        self._last_saved_at = 0.0  # When the cache file was last written
+
+    def start(self):
+        """Start the background IP refresh and, if configured, the GPS reader."""
+        if self._threads:
+            return
+        self._stop.clear()
+        # Fixed cameras never need a lookup
+        needs_lookup = '*' not in self.camera_locations
+        if needs_lookup:
+            self._threads.append(threading.Thread(target=self._refresh_loop, name="location-refresh", daemon=True))
+        if self.gps_port:
+            if serial is None:
+                print("⚠️  pyserial is not installed; GPS location is disabled (pip install pyserial)")
+            else:
+                self._threads.append(threading.Thread(target=self._gps_loop, name="location-gps", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the background threads."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.lookup_timeout + 1)
+        self._threads = []
+
+    def get_location(self, stream_id=None):
+        """
+        Return the best known location for a camera without blocking.
+
+        Returns:
+            dict: {'latitude', 'longitude', 'address', 'city', 'country', 'zip', 'source'}
+        """
+        static = self.camera_locations.get(stream_id) or self.camera_locations.get('*')
+        if static is not None:
+            return dict(static)
+
+        now = time.time()
+        with self._lock:
+            if self._gps_location is not None and now - self._gps_location_time <= GPS_FIX_MAX_AGE:
+                return dict(self._gps_location)
+            if self._ip_location is not None:
+                if now - self._ip_location_time > self.ttl:
+                    self._wake.set()  # Stale: refresh in the background, answer with what we have
+                return dict(self._ip_location)
+            if self._last_good is not None:
+                self._wake.set()
+                return dict(self._last_good)
+        return unavailable_location()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            location = self._lookup_ip_location()
+            if location is not None:
+                with self._lock:
+                    self._ip_location = location
+                    self._ip_location_time = time.time()
+                self._remember(location)
+                wait = self.ttl
+            else:
+                wait = self.retry_interval
+
+            self._wake.wait(timeout=wait)
+            self._wake.clear()
+
+    def _lookup_ip_location(self):
+        try:
+            response = requests.get(self.lookup_url, timeout=self.lookup_timeout)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('status', 'success') == 'success':
+                    return {
+                        'latitude': data.get('lat', 0.0),
+                        'longitude': data.get('lon', 0.0),
+                        'address': f"{data.get('city', 'Unknown')}, {data.get('regionName', 'Unknown')}",
+                        'city': data.get('city', 'Unknown'),
+                        'country': data.get('country', 'Unknown'),
+                        'zip': data.get('zip', 'Unknown'),
+                        'source': 'ip',
+                    }
+        except Exception as e:
+            print(f"⚠️  Could not get location from IP geolocation: {e}")
+        return None
+
+    def _gps_loop(self):
+        while not self._stop.is_set():
+            try:
+                with serial.Serial(self.gps_port, self.gps_baudrate, timeout=1) as port:
+                    print(f"🛰️  Reading GPS from {self.gps_port}")
+                    while not self._stop.is_set():
+                        line = port.readline().decode('ascii', errors='ignore')
+                        fix = parse_nmea_sentence(line)
+                        if fix is None:
+                            continue
+                        location = {
+                            **unavailable_location(),
+                            'latitude': fix[0],
+                            'longitude': fix[1],
+                            'address': f"GPS {fix[0]:.5f}, {fix[1]:.5f}",
+                            'source': 'gps',
+                        }
+                        with self._lock:
+                            self._gps_location = location
+                            self._gps_location_time = time.time()
+                        self._remember(location, min_interval=60.0)
+            except Exception as e:
+                print(f"⚠️  GPS read failed on {self.gps_port}: {e}")
+                self._stop.wait(5.0)
+
+    def _remember(self, location, min_interval=0.0):
+        """Keep location as the last known good position and save it to disk."""
+        now = time.time()
+        with self._lock:
+            self._last_good = location
+            if self.cache_path is None or (min_interval and now - self._last_saved_at < min_interval):
+                return
+            # Claimed before writing, so a concurrent caller does not write the same period too
+            self._last_saved_at = now
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({**location, 'savedAt': now}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️  Could not save location cache to {self.cache_path}: {e}")
+
+    def _load_cache(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                location = json.load(f)
+            return {**location, 'source': f"{location.get('source', 'unknown')} (last known)"}
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load location cache from {self.cache_path}: {e}")
+            return None
@@ -0,0 +1,186 @@
+"""
+Motion and region-of-interest gating for face detection.
+
+Before a frame is handed to the face detector, MotionGate compares a small
+grayscale copy of it with the previous one. Face detection then runs only on
+the part of the frame that changed (plus the faces that are being tracked and
+still need recognition), or not at all when nothing moved. A full detection
+still runs every refresh_interval seconds, so people who stand still are not
+missed for long.
+
+An optional region of interest (ROI) per camera restricts both motion and
+detection to the part of the view that matters, e.g. a doorway. Detection
+runs on the ROI's bounding box (one crop, even for disjoint regions); faces
+whose box centre lies outside every ROI polygon are then dropped with
+in_roi().
+
+Regions are returned as normalized (x1, y1, x2, y2) boxes with coordinates
+between 0 and 1, so they apply to the frame at any resolution.
+"""
+import cv2
+import numpy as np
+
+
+FULL_REGION = (0.0, 0.0, 1.0, 1.0)
+
+
+def _parse_roi(roi):
+    """Normalize an ROI spec (boxes and/or polygons in 0-1 coordinates) to a list of polygons."""
+    if roi is None:
+        return None
+    shapes = [roi] if len(roi) == 4 and all(np.isscalar(v) for v in roi) else roi
+    polygons = []
+    for shape in shapes:
+        if len(shape) == 4 and all(np.isscalar(v) for v in shape):
+            x1, y1, x2, y2 = shape
+            shape = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        polygons.append(np.clip(np.asarray(shape, dtype=np.float32), 0.0, 1.0))
+    return polygons or None
+
+
+def _points_in_polygon(points, polygon):
+    """Even-odd ray casting test of (N, 2) points against one (M, 2) polygon."""
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at_y = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.logical_and(crosses, x < x_at_y).sum(axis=1) % 2 == 1
+
+
+class MotionGate:
+    def __init__(self, roi=None, motion=True, threshold=25, min_area=0.002, padding=0.05,
+                 refresh_interval=2.0, width=160, full_frame_fraction=0.6):
+        """
+        Args:
+            roi: Region of interest as a box (x1, y1, x2, y2) or a list of boxes and/or
+                 polygons [(x, y), ...], all in 0-1 frame coordinates (None = whole frame)
+            motion: Gate detection on motion; False only applies the ROI
+            threshold: Per-pixel brightness change (0-255) that counts as motion
+            min_area: Smallest moving blob, as a fraction of the frame, that triggers detection
+            padding: Margin added around moving regions, as a fraction of the frame size
+            refresh_interval: Seconds between full (ROI-wide) detections regardless of motion
+            width: Width of the downscaled frame motion is computed on
+            full_frame_fraction: Detect on the whole ROI once the region covers more than this
+                                 fraction of it (cropping a large region saves little)
+        """
+        self.motion = motion
+        self.threshold = threshold
+        self.min_area = min_area
+        self.padding = padding
+        self.refresh_interval = refresh_interval
+        self.width = width
+        self.full_frame_fraction = full_frame_fraction
+
+        self.roi_polygons = _parse_roi(roi)
+        if self.roi_polygons is None:
+            self.roi_box = FULL_REGION
+        else:
+            points = np.concatenate(self.roi_polygons)
+            self.roi_box = (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())
+
+        self._previous = None
+        self._mask = None
+        self._last_full_detection = None
+        self.frames_skipped = 0
+        self.frames_cropped = 0
+
+    def in_roi(self, boxes, width, height):
+        """
+        Check which detections lie inside the ROI.
+
+        Args:
+            boxes: (N, 4+) x1, y1, x2, y2 boxes in pixels of a width x height frame
+
+        Returns:
+            (N,) bool array, True where the box centre is inside one of the ROI polygons
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(len(boxes), -1)
+        if self.roi_polygons is None or len(boxes) == 0:
+            return np.ones(len(boxes), dtype=bool)
+        centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / (2 * width),
+                            (boxes[:, 1] + boxes[:, 3]) / (2 * height)], axis=1)
+        inside = np.zeros(len(boxes), dtype=bool)
+        for polygon in self.roi_polygons:
+            inside |= _points_in_polygon(centers, polygon)
+        return inside
+
+    def _roi_mask(self, shape):
+        if self.roi_polygons is None:
+            return None
+        if self._mask is None or self._mask.shape != shape:
+            h, w = shape
+            self._mask = np.zeros(shape, dtype=np.uint8)
+            scale = np.array([w - 1, h - 1], dtype=np.float32)
+            cv2.fillPoly(self._mask, [np.round(polygon * scale).astype(np.int32) for polygon in self.roi_polygons], 255)
+        return self._mask
+
+    def _motion_boxes(self, frame):
+        """Return normalized boxes of the moving areas inside the ROI (None if there is no reference frame yet)."""
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, round(self.width * h / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return None
+
+        _, moving = cv2.threshold(cv2.absdiff(gray, previous), self.threshold, 255, cv2.THRESH_BINARY)
+        mask = self._roi_mask(gray.shape)
+        if mask is not None:
+            moving = cv2.bitwise_and(moving, mask)
+        moving = cv2.dilate(moving, None, iterations=2)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(moving)
+        sh, sw = gray.shape
+        min_pixels = self.min_area * sh * sw
+        return [(x / sw, y / sh, (x + bw) / sw, (y + bh) / sh)
+                for x, y, bw, bh, area in stats[1:count] if area >= min_pixels]
+
+    def select_region(self, frame, refresh_boxes=(), track_boxes=(), now=0.0):
+        """
+        Decide where to run face detection in this frame.
+
+        Args:
+            frame: BGR frame
+            refresh_boxes: (x1, y1, x2, y2) frame-pixel boxes of tracked faces that must be
+                           detected again (e.g. to be re-recognized), even without motion
+            track_boxes: Frame-pixel boxes of all other visible tracked faces; they do not
+                         trigger detection, but are kept inside the region when it runs so
+                         their tracks are not lost
+            now: Current time in seconds
+
+        Returns:
+            Normalized (x1, y1, x2, y2) region to run detection on, or None to skip
+            detection in this frame
+        """
+        motion_boxes = self._motion_boxes(frame) if self.motion else None
+        refresh_due = self._last_full_detection is None or now - self._last_full_detection >= self.refresh_interval
+        if motion_boxes is None or refresh_due:
+            self._last_full_detection = now
+            return self.roi_box
+
+        if not motion_boxes and len(refresh_boxes) == 0:
+            self.frames_skipped += 1
+            return None
+
+        h, w = frame.shape[:2]
+        boxes = motion_boxes + [(x1 / w, y1 / h, x2 / w, y2 / h)
+                                for x1, y1, x2, y2 in list(refresh_boxes) + list(track_boxes)]
+
+        # One region around everything that moved and every visible face, clipped to the ROI
+        boxes = np.asarray(boxes, dtype=np.float32)
+        rx1, ry1, rx2, ry2 = self.roi_box
+        x1 = max(rx1, float(boxes[:, 0].min()) - self.padding)
+        y1 = max(ry1, float(boxes[:, 1].min()) - self.padding)
+        x2 = min(rx2, float(boxes[:, 2].max()) + self.padding)
+        y2 = min(ry2, float(boxes[:, 3].max()) + self.padding)
+        if x2 <= x1 or y2 <= y1:
+            self.frames_skipped += 1
+            return None
+
+        roi_area = (rx2 - rx1) * (ry2 - ry1)
+        if (x2 - x1) * (y2 - y1) > self.full_frame_fraction * roi_area:
+            return self.roi_box
+        self.frames_cropped += 1
+        return (x1, y1, x2, y2)
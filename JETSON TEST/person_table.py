@@ -0,0 +1,68 @@
+"""
+Columnar person metadata shared by the face and voice galleries.
+
+Every person (upload document) is one row. Each detail column (name, age,
+city, ...) is an int32 array of codes into one interned string table, so a
+value shared by many people, like a city, is stored once, and nothing is
+copied per photo or voice row. The galleries keep only an int32 person row
+per identity/voice row. Match info dicts are built on demand, for the few
+rows that actually matched.
+"""
+import sys
+
+import numpy as np
+
+
+PERSON_FIELDS = ("name", "age", "city", "dateSeen", "contact")
+
+
+class PersonTable:
+    def __init__(self, people):
+        """
+        Args:
+            people: {doc_id: person details} as produced by parse_upload_document
+        """
+        self.doc_ids = [sys.intern(doc_id) for doc_id in people]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+
+        self._values = []
+        codes_by_value = {}
+        self._columns = {}
+        for field in PERSON_FIELDS:
+            codes = np.empty(len(self.doc_ids), dtype=np.int32)
+            for row, doc_id in enumerate(self.doc_ids):
+                value = people[doc_id].get(field, "N/A")
+                code = codes_by_value.get(value)
+                if code is None:
+                    code = codes_by_value[value] = len(self._values)
+                    self._values.append(sys.intern(value) if isinstance(value, str) else value)
+                codes[row] = code
+            self._columns[field] = codes
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._rows
+
+    def rows(self, doc_ids):
+        """Return the int32 rows of the given document IDs."""
+        return np.fromiter((self._rows[doc_id] for doc_id in doc_ids), dtype=np.int32, count=len(doc_ids))
+
+    def value(self, row, field):
+        return self._values[self._columns[field][row]]
+
+    def details(self, row):
+        """Rebuild the person details dict of one row (as produced by parse_upload_document)."""
+        return {field: self._values[self._columns[field][row]] for field in PERSON_FIELDS}
+
+    def to_dict(self):
+        """Rebuild {doc_id: person details} for every row (for merging and saving snapshots)."""
+        return {doc_id: self.details(row) for row, doc_id in enumerate(self.doc_ids)}
+
+    def info(self, row, **extra):
+        """Build the info dict of one person (details, 'docId' and any extra keys)."""
+        info = self.details(row)
+        info["docId"] = self.doc_ids[row]
+        info.update(extra)
+        return info
@@ -0,0 +1,131 @@
+"""
+Persistent detector state that must survive restarts.
+
+Alert cooldowns and saved-evidence markers are kept in a small SQLite
+database. The state is read once at startup; afterwards the detector keeps
+using its in-memory copies and only queues changes here, which a background
+thread writes to the database. Frame processing never waits on disk I/O.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_cooldowns (
+    person_key TEXT PRIMARY KEY,
+    last_alert_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS saved_evidence (
+    person_key TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    stream TEXT
+);
+"""
+
+
+class DetectionStateStore:
+    def __init__(self, path='detector_state.db'):
+        """
+        Args:
+            path: SQLite database file (None = keep state in memory only)
+        """
+        self.path = Path(path) if path else None
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # State as of startup; owners keep their own live copies and report changes
+        self.alert_times, self.saved_persons = self._load()
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self.path))
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _load(self):
+        """Return ({person_key: last_alert_time}, {person_key: saved_at}) from the database."""
+        if self.path is None or not self.path.exists():
+            return {}, {}
+        try:
+            connection = self._connect()
+            try:
+                alert_times = dict(connection.execute(
+                    "SELECT person_key, last_alert_time FROM alert_cooldowns"))
+                saved_persons = dict(connection.execute(
+                    "SELECT person_key, saved_at FROM saved_evidence"))
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️  Could not load detector state from {self.path}: {e}")
+            return {}, {}
+        print(f"📂 Restored state: {len(alert_times)} alert cooldown(s), "
+              f"{len(saved_persons)} saved person(s) from {self.path}")
+        return alert_times, saved_persons
+
+    def start(self):
+        """Start the background writer thread."""
+        if self.path is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Write all queued changes, then stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def record_alert(self, person_key, alert_time):
+        """Remember when the last alert for person_key was queued (None = forget it)."""
+        if alert_time is None:
+            self._submit("DELETE FROM alert_cooldowns WHERE person_key = ?", (person_key,))
+        else:
+            self._submit("INSERT OR REPLACE INTO alert_cooldowns (person_key, last_alert_time) VALUES (?, ?)",
+                         (person_key, alert_time))
+
+    def record_saved(self, person_key, stream_id=None, saved_at=None):
+        """Remember that evidence for person_key has been saved."""
+        saved_at = time.time() if saved_at is None else saved_at
+        self._submit("INSERT OR REPLACE INTO saved_evidence (person_key, saved_at, stream) VALUES (?, ?, ?)",
+                     (person_key, saved_at, stream_id))
+
+    def prune_alerts(self, older_than):
+        """Delete cooldown entries last alerted before older_than (epoch seconds)."""
+        self._submit("DELETE FROM alert_cooldowns WHERE last_alert_time < ?", (older_than,))
+
+    def _submit(self, statement, params):
+        if self.path is not None:
+            self._queue.put((statement, params))
+
+    def _run(self):
+        try:
+            connection = self._connect()
+        except sqlite3.Error as e:
+            print(f"❌ Could not open detector state database {self.path}: {e}")
+            return
+
+        try:
+            stopping = False
+            while not stopping:
+                # Apply everything that is queued in one transaction
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stopping = True
+                    batch = [item for item in batch if item is not None]
+                try:
+                    with connection:
+                        for statement, params in batch:
+                            connection.execute(statement, params)
+                except sqlite3.Error as e:
+                    print(f"⚠️  Could not write detector state: {e}")
+        finally:
+            connection.close()
@@ -0,0 +1,66 @@
+"""
+Per-stream detection state.
+
+The detector shares one model and one gallery across all its video streams,
+but face tracks, continuous-detection timers, the motion gate and pipeline
+statistics belong to a single camera. Each stream keeps them in its own StreamState.
+"""
+from collections import deque
+
+import numpy as np
+
+from face_tracker import FaceTracker
+
+
+class StreamState:
+    def __init__(self, stream_id, smoothing_frames=5, reembed_interval=10, stats_window=30, motion_gate=None,
+                 unknown_reembed_interval=3):
+        """
+        Args:
+            stream_id: Identifier of the stream (shown in window titles and logs)
+            smoothing_frames: Recognitions per face track to smooth similarity and vote identity over
+            reembed_interval: Frames between re-embeddings of a stable, identified face track
+            stats_window: Number of frames kept for FPS and latency statistics
+            motion_gate: MotionGate deciding where face detection runs (None = whole frame, every frame)
+            unknown_reembed_interval: Frames between re-embeddings of a stable face track that
+                                      is not identified
+        """
+        self.stream_id = stream_id
+        self.tracker = FaceTracker(smoothing_frames=smoothing_frames, reembed_interval=reembed_interval,
+                                   unknown_reembed_interval=unknown_reembed_interval)
+        self.detection_timers = {}  # {person_key: {'first_detection', 'name', 'info'}}
+        self.motion_gate = motion_gate
+        self.frames_until_detection = 0  # Frames to skip before the next detection (adaptive quality)
+
+        self.latest_result = None
+        self.last_result_time = None
+        self.last_display_time = None
+        self.display_fps_history = deque(maxlen=stats_window)
+        self.inference_fps_history = deque(maxlen=stats_window)
+        self.latency_history = deque(maxlen=stats_window)
+
+    def record_result(self, result):
+        """Keep an inference result for display and update inference FPS and latency."""
+        self.latest_result = result
+        self.latency_history.append(result.latency)
+        if self.last_result_time is not None and result.decided_at > self.last_result_time:
+            self.inference_fps_history.append(1.0 / (result.decided_at - self.last_result_time))
+        self.last_result_time = result.decided_at
+
+    def record_display(self, display_time):
+        """Update the display FPS with a frame shown at display_time."""
+        if self.last_display_time is not None and display_time > self.last_display_time:
+            self.display_fps_history.append(1.0 / (display_time - self.last_display_time))
+        self.last_display_time = display_time
+
+    def status_lines(self):
+        """Return the (text, color) status panel lines for this stream."""
+        display_fps = np.mean(self.display_fps_history) if self.display_fps_history else 0
+        inference_fps = np.mean(self.inference_fps_history) if self.inference_fps_history else 0
+        latency_ms = self.latest_result.latency * 1000 if self.latest_result is not None else 0.0
+        faces = len(self.latest_result.output) if self.latest_result is not None else 0
+        return [
+            (f"FPS: {display_fps:.1f} | Inference: {inference_fps:.1f}", (0, 255, 0)),
+            (f"Latency: {latency_ms:.0f} ms", (0, 255, 255)),
+            (f"Faces: {faces}", (255, 255, 255)),
+        ]
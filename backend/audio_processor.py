@@ -1,65 +1,97 @@
 """
 Audio processing module for voice embedding extraction using resemblyzer.
+
+Uploaded audio is decoded in memory: soundfile reads WAV, FLAC and OGG
+directly from the request bytes, and other formats (MP3, M4A, WebM, ...) are
+decoded by piping them through ffmpeg. No temporary files are written.
 """
 import numpy as np
 from resemblyzer import VoiceEncoder, preprocess_wav
-from scipy.io.wavfile import write
+import soundfile as sf
 import io
-import tempfile
-import os
-from typing import Optional
+import subprocess
+from typing import Optional, Tuple
 
-# Initialize the voice encoder
-# This will be initialized once when the module is imported
+# Shared voice encoder for callers that do not bring their own.
+# Initialized lazily on first use; the API server gives each inference
+# worker its own instance instead (see inference_pool.py).
 encoder = None
 
+def create_voice_encoder() -> VoiceEncoder:
+    """Create a new voice encoder instance."""
+    return VoiceEncoder()
+
+def warm_up_voice_encoder(voice_encoder: VoiceEncoder, sample_rate: int = 16000) -> None:
+    """Embed one second of low-level noise so the first real request is not slow."""
+    noise = np.random.default_rng(0).standard_normal(sample_rate).astype(np.float32) * 0.01
+    voice_encoder.embed_utterance(noise)
+
 def initialize_voice_encoder():
-    """Initialize the voice encoder."""
+    """Initialize the shared voice encoder."""
     global encoder
     if encoder is None:
-        encoder = VoiceEncoder()
+        encoder = create_voice_encoder()
     return encoder
 
-def extract_voice_embedding(audio_data: bytes, sample_rate: int = 16000) -> Optional[np.ndarray]:
+def decode_audio(audio_data: bytes, sample_rate: int = 16000) -> Tuple[np.ndarray, int]:
+    """
+    Decode audio bytes to mono float32 samples without touching the disk.
+    
+    Args:
+        audio_data: Encoded audio (WAV, FLAC, OGG, MP3, M4A, ...)
+        sample_rate: Rate ffmpeg resamples to when it has to decode the audio
+        
+    Returns:
+        (samples, sample_rate) of the decoded audio
+    
+    Raises:
+        ValueError: If the audio cannot be decoded
+    """
+    try:
+        samples, source_sr = sf.read(io.BytesIO(audio_data), dtype='float32', always_2d=True)
+        return samples.mean(axis=1), source_sr
+    except RuntimeError:
+        # Not a format libsndfile reads (soundfile raises LibsndfileError); let ffmpeg decode it
+        pass
+    
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            input=audio_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+    except FileNotFoundError:
+        raise ValueError("Unsupported audio format (install ffmpeg to decode compressed audio)")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Could not decode audio: {e.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32), sample_rate
+
+def extract_voice_embedding(audio_data: bytes, sample_rate: int = 16000,
+                            voice_encoder: Optional[VoiceEncoder] = None) -> Optional[np.ndarray]:
     """
     Extract voice embedding from audio data.
     
     Args:
         audio_data: Audio data as bytes (supports WAV, MP3, M4A, etc.)
-        sample_rate: Sample rate of the audio (default: 16000)
+        sample_rate: Sample rate compressed audio is decoded at (default: 16000)
+        voice_encoder: Voice encoder to use (defaults to the shared module-level encoder)
         
     Returns:
         Voice embedding as numpy array, or None if processing fails
     """
     try:
-        # Initialize voice encoder if not already done
-        if encoder is None:
-            initialize_voice_encoder()
+        # Fall back to the shared encoder, initializing it if not already done
+        if voice_encoder is None:
+            voice_encoder = initialize_voice_encoder()
         
-        # Create a temporary file to save the audio
-        # Use .wav extension but resemblyzer can handle various formats
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            temp_path = temp_file.name
-            try:
-                # Write audio data to temporary file
-                temp_file.write(audio_data)
-                temp_file.flush()
-                
-                # Preprocess the audio file (resemblyzer handles format conversion)
-                # preprocess_wav can handle WAV, MP3, M4A, FLAC, etc.
-                wav = preprocess_wav(temp_path)
-                
-                # Extract embedding
-                embedding = encoder.embed_utterance(wav)
-                
-                return embedding
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    try:
-                        os.unlink(temp_path)
-                    except:
-                        pass
+        # Decode in memory, then resample, normalize and trim silence
+        samples, source_sr = decode_audio(audio_data, sample_rate)
+        wav = preprocess_wav(samples, source_sr=source_sr)
+        
+        # Extract embedding
+        embedding = voice_encoder.embed_utterance(wav)
+        
+        return embedding
     
     except Exception as e:
         print(f"Error extracting voice embedding: {str(e)}")
@@ -82,7 +114,3 @@ def process_audio(audio_data: bytes, sample_rate: int = 16000) -> dict:
         "has_voice": embedding is not None,
         "embedding": embedding.tolist() if embedding is not None else None
     }
-
-# Initialize on module import
-initialize_voice_encoder()
-
@@ -0,0 +1,96 @@
+"""
+Compact binary encoding for embeddings stored in Firestore.
+
+An encoded embedding is a bytes value: a 4-byte header followed by the raw
+little-endian vector.
+
+    byte 0   magic (b"E")
+    byte 1   format version (EMBEDDING_FORMAT_VERSION)
+    byte 2   dtype code: b"f" = float32, b"e" = float16
+    byte 3   reserved (0)
+
+The 4-byte header keeps float32 data aligned, so decoding is a zero-copy
+np.frombuffer. Older documents store embeddings as JSON float lists; those
+still decode.
+
+The detector keeps a mirror of decode_embedding and the constants below in
+JETSON TEST/gallery_snapshot.py (it is deployed without this package).
+Change both together and keep EMBEDDING_FORMAT_VERSION equal. The detector
+skips embeddings with a newer version instead of decoding them.
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+
+EMBEDDING_MAGIC = b"E"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER_SIZE = 4
+
+_DTYPE_CODES = {
+    "float32": b"f",
+    "float16": b"e",
+}
+_CODE_DTYPES = {
+    b"f": np.dtype("<f4"),
+    b"e": np.dtype("<f2"),
+}
+
+# Storage precision for new embeddings: "float32" (default) or "float16" (half the size)
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+
+
+def encode_embedding(embedding: np.ndarray, dtype: Optional[str] = None) -> bytes:
+    """
+    Encode an embedding as tagged little-endian bytes.
+
+    Args:
+        embedding: 1-D embedding vector
+        dtype: "float32" or "float16" (defaults to EMBEDDING_DTYPE)
+
+    Returns:
+        Encoded bytes (store directly as a Firestore bytes field)
+    """
+    dtype = dtype or EMBEDDING_DTYPE
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    code = _DTYPE_CODES[dtype]
+    vector = np.ascontiguousarray(embedding, dtype=_CODE_DTYPES[code]).ravel()
+    header = EMBEDDING_MAGIC + bytes([EMBEDDING_FORMAT_VERSION]) + code + b"\x00"
+    return header + vector.tobytes()
+
+
+def decode_embedding(value) -> Optional[np.ndarray]:
+    """
+    Decode an embedding stored in a Firestore document.
+
+    Args:
+        value: Encoded bytes, a legacy list of floats, or None
+
+    Returns:
+        1-D float32 array (a read-only view of value for float32 data),
+        or None if value is None
+    """
+    if value is None:
+        return None
+
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        # Legacy format: JSON list of floats
+        return np.asarray(value, dtype=np.float32)
+
+    header = bytes(value[:EMBEDDING_HEADER_SIZE])
+    if len(header) < EMBEDDING_HEADER_SIZE or header[:1] != EMBEDDING_MAGIC:
+        raise ValueError("Not an encoded embedding")
+    if header[1] != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version: {header[1]}")
+
+    dtype = _CODE_DTYPES.get(header[2:3])
+    if dtype is None:
+        raise ValueError(f"Unsupported embedding dtype code: {header[2:3]!r}")
+
+    vector = np.frombuffer(value, dtype=dtype, offset=EMBEDDING_HEADER_SIZE)
+    if vector.dtype != np.float32:
+        vector = vector.astype(np.float32)
+    return vector
@@ -3,51 +3,182 @@ Image processing module for face embedding extraction using insightface.
 """
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
 import cv2
 import numpy as np
-from typing import Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
-# Initialize the face analysis app
-# This will be initialized once when the module is imported
+# Shared face analysis app for callers that do not bring their own.
+# Initialized lazily on first use; the API server gives each inference
+# worker its own instance instead (see inference_pool.py).
 app = None
 
+# buffalo_l modules to load. Only detection and recognition are needed to produce
+# embeddings; genderage and the landmark models are opt-in via FACE_MODULES
+# (comma-separated, e.g. "detection,recognition,genderage").
+REQUIRED_FACE_MODULES = ("detection", "recognition")
+
+# Thread pool for decoding uploaded images in parallel (cv2.imdecode releases the GIL)
+_decode_executor = None
+
+def resolve_face_modules(modules: Optional[List[str]] = None) -> List[str]:
+    """
+    Build the list of face analysis modules to load.
+    
+    Args:
+        modules: Requested modules (defaults to the FACE_MODULES environment variable)
+        
+    Returns:
+        Module names, always including detection and recognition
+    """
+    if modules is None:
+        modules = [m.strip() for m in os.getenv("FACE_MODULES", "").split(",") if m.strip()]
+    resolved = list(REQUIRED_FACE_MODULES)
+    resolved.extend(m for m in modules if m not in resolved)
+    return resolved
+
+def create_face_analysis(modules: Optional[List[str]] = None) -> FaceAnalysis:
+    """
+    Create and prepare a new face analysis app instance.
+    
+    Args:
+        modules: Modules to load in addition to detection and recognition
+                 (defaults to the FACE_MODULES environment variable)
+    """
+    face_app = FaceAnalysis(name="buffalo_l", allowed_modules=resolve_face_modules(modules))
+    face_app.prepare(ctx_id=0)  # Use CPU (ctx_id=0), use ctx_id=-1 for GPU if available
+    return face_app
+
+def warm_up_face_analysis(face_app: FaceAnalysis) -> None:
+    """Run the detection and recognition models once so the first real request is not slow."""
+    face_app.get(np.zeros((640, 640, 3), dtype=np.uint8))
+    recognition = face_app.models.get("recognition")
+    if recognition is not None:
+        recognition.get_feat(np.zeros((112, 112, 3), dtype=np.uint8))
+
 def initialize_face_analysis():
-    """Initialize the face analysis app."""
+    """Initialize the shared face analysis app."""
     global app
     if app is None:
-        app = FaceAnalysis(name="buffalo_l")
-        app.prepare(ctx_id=0)  # Use CPU (ctx_id=0), use ctx_id=-1 for GPU if available
+        app = create_face_analysis()
     return app
 
-def extract_embedding(image_data: bytes) -> Optional[np.ndarray]:
+def _get_decode_executor() -> ThreadPoolExecutor:
+    """Get the shared image decoding thread pool, creating it on first use."""
+    global _decode_executor
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 1),
+            thread_name_prefix="image-decode",
+        )
+    return _decode_executor
+
+def decode_image(image_data: bytes) -> Optional[np.ndarray]:
     """
-    Extract face embedding from image data.
+    Decode image bytes into an RGB array.
     
     Args:
         image_data: Image data as bytes
         
     Returns:
-        Normalized embedding as numpy array, or None if no face detected
+        RGB image as numpy array, or None if the data could not be decoded
     """
     try:
-        # Initialize face analysis if not already done
-        if app is None:
-            initialize_face_analysis()
-        
-        # Convert bytes to numpy array
         nparr = np.frombuffer(image_data, np.uint8)
-        
-        # Decode image
         img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
         if img is None:
             return None
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    except Exception as e:
+        print(f"Error decoding image: {str(e)}")
+        return None
+
+def extract_embeddings_batch(images: List[bytes], face_app: Optional[FaceAnalysis] = None) -> List[Optional[np.ndarray]]:
+    """
+    Extract one face embedding per image for a batch of images.
+    
+    Images are decoded in parallel, faces are detected and aligned per image,
+    and the recognition model runs once over all aligned crops instead of
+    once per image.
+    
+    Args:
+        images: List of image data as bytes
+        face_app: Face analysis app to use (defaults to the shared module-level app)
         
-        # Convert BGR to RGB
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    Returns:
+        List with one entry per input image: the normalized embedding of the
+        most confident face, or None if no face was detected
+    """
+    results: List[Optional[np.ndarray]] = [None] * len(images)
+    if not images:
+        return results
+    
+    if face_app is None:
+        face_app = initialize_face_analysis()
+    recognition = face_app.models["recognition"]
+    
+    decoded = list(_get_decode_executor().map(decode_image, images))
+    
+    # Detect and align the most confident face of every image
+    crops = []
+    crop_owners = []
+    for idx in range(len(decoded)):
+        img = decoded[idx]
+        if img is None:
+            continue
+        try:
+            bboxes, kpss = face_app.det_model.detect(img, max_num=0, metric="default")
+            if bboxes.shape[0] > 0 and kpss is not None:
+                crops.append(face_align.norm_crop(img, landmark=kpss[0], image_size=recognition.input_size[0]))
+                crop_owners.append(idx)
+        except Exception as e:
+            print(f"Error detecting face in image {idx}: {str(e)}")
+        # Release the full-size image as soon as its crop is taken
+        decoded[idx] = None
+    
+    if not crops:
+        return results
+    
+    try:
+        # Single recognition pass over the stacked crops
+        features = recognition.get_feat(crops)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        features = features / norms
+    except Exception as e:
+        print(f"Error extracting batch embeddings: {str(e)}")
+        return results
+    
+    for idx, feature in zip(crop_owners, features):
+        results[idx] = feature
+    return results
+
+def extract_embedding(image_data: bytes, face_app: Optional[FaceAnalysis] = None) -> Optional[np.ndarray]:
+    """
+    Extract face embedding from image data.
+    
+    Args:
+        image_data: Image data as bytes
+        face_app: Face analysis app to use (defaults to the shared module-level app)
+        
+    Returns:
+        Normalized embedding as numpy array, or None if no face detected
+    """
+    try:
+        # Fall back to the shared app, initializing it if not already done
+        if face_app is None:
+            face_app = initialize_face_analysis()
+        
+        # Decode bytes into an RGB image
+        img_rgb = decode_image(image_data)
+        
+        if img_rgb is None:
+            return None
         
         # Get faces
-        faces = app.get(img_rgb)
+        faces = face_app.get(img_rgb)
         
         if len(faces) == 0:
             return None
@@ -75,11 +206,3 @@ def process_image(image_data: bytes) -> dict:
         "has_face": embedding is not None,
         "embedding": embedding.tolist() if embedding is not None else None
     }
-
-# Initialize on module import
-initialize_face_analysis()
-
-
-
-
-
@@ -0,0 +1,132 @@
+"""
+Bounded worker pool for running face and voice inference off the event loop.
+
+Each worker thread owns its own warmed-up FaceAnalysis and VoiceEncoder, so
+requests never share a model session. Jobs wait in a bounded queue; when it
+is full, submit() raises InferenceQueueFull instead of letting work pile up.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from image_processor import create_face_analysis, warm_up_face_analysis
+from audio_processor import create_voice_encoder, warm_up_voice_encoder
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue has no room for another job."""
+
+
+class InferenceWorker:
+    """Model instances owned by a single inference thread."""
+
+    def __init__(self):
+        self.face_app = create_face_analysis()
+        warm_up_face_analysis(self.face_app)
+        self.voice_encoder = create_voice_encoder()
+        warm_up_voice_encoder(self.voice_encoder)
+
+
+class InferencePool:
+    def __init__(self, num_workers: int = 1, queue_size: int = 8):
+        """
+        Pool of inference threads fed from a bounded job queue.
+
+        Args:
+            num_workers: Number of worker threads (each loads its own models)
+            queue_size: Maximum number of jobs waiting for a free worker
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._threads: List[threading.Thread] = []
+        self._startup_errors: List[Exception] = []
+
+    def start(self) -> None:
+        """Start the worker threads and block until every worker has loaded its models."""
+        if self._threads:
+            return
+
+        ready_events = []
+        for idx in range(self.num_workers):
+            ready = threading.Event()
+            thread = threading.Thread(
+                target=self._worker_loop,
+                args=(ready,),
+                name=f"inference-worker-{idx}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+            ready_events.append(ready)
+
+        for ready in ready_events:
+            ready.wait()
+
+        if self._startup_errors:
+            self.shutdown()
+            raise RuntimeError(f"Inference worker failed to start: {self._startup_errors[0]}")
+
+        print(f"✅ Inference pool started ({self.num_workers} workers, queue size {self.queue_size})")
+
+    def shutdown(self) -> None:
+        """Stop all workers after the jobs already queued have finished."""
+        live_threads = [thread for thread in self._threads if thread.is_alive()]
+        for _ in live_threads:
+            self._jobs.put(None)
+        for thread in live_threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Queue fn(worker, *args) to run on the next free worker.
+
+        Raises:
+            InferenceQueueFull: If the job queue is already at capacity
+        """
+        if not self._threads:
+            raise RuntimeError("Inference pool is not running")
+
+        future: Future = Future()
+        try:
+            self._jobs.put_nowait((future, fn, args))
+        except queue.Full:
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self.queue_size} jobs waiting)"
+            ) from None
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Submit fn(worker, *args) and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _worker_loop(self, ready: threading.Event) -> None:
+        try:
+            worker = InferenceWorker()
+        except Exception as e:
+            print(f"❌ Error initializing inference worker: {e}")
+            self._startup_errors.append(e)
+            ready.set()
+            return
+        ready.set()
+
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(worker, *args))
+            except Exception as e:
+                future.set_exception(e)
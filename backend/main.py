@@ -1,19 +1,39 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import List, Optional
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
-import base64
 from datetime import datetime
 from dotenv import load_dotenv
-from image_processor import extract_embedding
+from image_processor import extract_embeddings_batch
 from audio_processor import extract_voice_embedding
+from inference_pool import InferencePool, InferenceQueueFull
+from media_store import create_media_store
+from embedding_codec import encode_embedding
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="FindMe Backend API")
+# Inference pool configuration: each worker holds its own copy of the models,
+# so memory grows with INFERENCE_WORKERS, and each model session already uses
+# every core, so one worker is the default. Uploads beyond INFERENCE_QUEUE_SIZE
+# waiting jobs are rejected with 503 instead of queueing without bound.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "8"))
+INFERENCE_RETRY_AFTER_SECONDS = 5
+
+inference_pool = InferencePool(num_workers=INFERENCE_WORKERS, queue_size=INFERENCE_QUEUE_SIZE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inference_pool.start()
+    yield
+    inference_pool.shutdown()
+
+app = FastAPI(title="FindMe Backend API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -77,7 +97,11 @@ if not firebase_admin._apps:
         )
     
     try:
-        firebase_admin.initialize_app(cred)
+        # The app's default Storage bucket, used by the firebase media store
+        options = {}
+        if os.getenv("FIREBASE_STORAGE_BUCKET"):
+            options["storageBucket"] = os.getenv("FIREBASE_STORAGE_BUCKET")
+        firebase_admin.initialize_app(cred, options or None)
         print("✅ Firebase Admin SDK initialized successfully")
     except Exception as e:
         print(f"❌ Error initializing Firebase: {e}")
@@ -90,6 +114,27 @@ except Exception as e:
     print(f"❌ Error connecting to Firestore: {e}")
     raise
 
+# Uploaded photos and audio are kept in the media store; Firestore documents
+# only hold embeddings and references to the stored media.
+media_store = create_media_store()
+
+def _extract_upload_embeddings(worker, image_blobs: List[bytes], audio_data: Optional[bytes]):
+    """
+    Extract face and voice embeddings for one upload on an inference worker.
+    
+    Returns:
+        (face_embeddings, voice_embedding) where face_embeddings has one entry
+        per image (None if no face was found) and voice_embedding is None if
+        no audio was given or no voice was found
+    """
+    face_embeddings = extract_embeddings_batch(image_blobs, worker.face_app)
+    
+    voice_embedding = None
+    if audio_data is not None:
+        voice_embedding = extract_voice_embedding(audio_data, voice_encoder=worker.voice_encoder)
+    
+    return face_embeddings, voice_embedding
+
 @app.get("/")
 async def root():
     return {"message": "FindMe Backend API is running"}
@@ -114,74 +159,74 @@ async def upload_missing_person(
         if not images or len(images) == 0:
             raise HTTPException(status_code=400, detail="At least one image is required")
         
-        # Process all images and extract embeddings
+        # Read all uploaded files first; only I/O happens on the event loop
+        image_blobs = [await image.read() for image in images]
+        
+        audio_data = None
+        if audio:
+            try:
+                audio_data = await audio.read()
+            except Exception as e:
+                print(f"Error reading audio: {str(e)}")
+        
+        # Run face and voice inference on the worker pool
+        try:
+            face_embeddings, audio_embedding = await inference_pool.run(
+                _extract_upload_embeddings, image_blobs, audio_data
+            )
+        except InferenceQueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy processing other uploads. Please try again shortly.",
+                headers={"Retry-After": str(INFERENCE_RETRY_AFTER_SECONDS)},
+            )
+        
+        # Store the media outside Firestore (off the event loop)
+        image_refs = [
+            await run_in_threadpool(media_store.put, image_data, image.content_type, "images")
+            for image, image_data in zip(images, image_blobs)
+        ]
+        
+        # Build per-image metadata
         processed_images = []
         embeddings = []
-        image_base64_list = []
         
-        for idx, image in enumerate(images):
-            # Read image data
-            image_data = await image.read()
-            
-            # Convert image to base64 for storage
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            image_base64_list.append(image_base64)
-            
-            # Process image and extract embedding
-            embedding = extract_embedding(image_data)
-            
+        for idx, (image, image_ref, embedding) in enumerate(zip(images, image_refs, face_embeddings)):
             if embedding is None:
-                # If no face detected, still store the image but without embedding
+                # If no face detected, still record the image but without embedding
                 processed_images.append({
                     "index": idx,
                     "filename": image.filename or f"image_{idx}.jpg",
+                    **image_ref,
                     "has_face": False,
                     "embedding": None
                 })
             else:
-                # Convert numpy array to list for JSON serialization
-                embedding_list = embedding.tolist()
-                embeddings.append(embedding_list)
+                # Store the embedding as compact tagged bytes (see embedding_codec.py)
+                encoded_embedding = encode_embedding(embedding)
+                embeddings.append(encoded_embedding)
                 
                 processed_images.append({
                     "index": idx,
                     "filename": image.filename or f"image_{idx}.jpg",
+                    **image_ref,
                     "has_face": True,
-                    "embedding": embedding_list
+                    "embedding": encoded_embedding
                 })
         
-        # Process audio if provided
-        audio_embedding = None
-        audio_base64 = None
+        # Build audio metadata if provided
         audio_metadata = None
         
         if audio:
-            try:
-                audio_data = await audio.read()
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                # Extract voice embedding
-                audio_embedding = extract_voice_embedding(audio_data)
-                
-                if audio_embedding is not None:
-                    audio_metadata = {
-                        "filename": audio.filename or "audio.wav",
-                        "has_voice": True,
-                        "embedding": audio_embedding.tolist()
-                    }
-                else:
-                    audio_metadata = {
-                        "filename": audio.filename or "audio.wav",
-                        "has_voice": False,
-                        "embedding": None
-                    }
-            except Exception as e:
-                print(f"Error processing audio: {str(e)}")
-                audio_metadata = {
-                    "filename": audio.filename or "audio.wav",
-                    "has_voice": False,
-                    "embedding": None
-                }
+            audio_ref = {}
+            if audio_data is not None:
+                audio_ref = await run_in_threadpool(media_store.put, audio_data, audio.content_type, "audio")
+            audio_metadata = {
+                "filename": audio.filename or "audio.wav",
+                **audio_ref,
+                "has_voice": audio_embedding is not None,
+                "embedding": encode_embedding(audio_embedding) if audio_embedding is not None else None
+            }
         
         # Create document data
         upload_data = {
@@ -192,16 +237,14 @@ async def upload_missing_person(
             "contactPhone": contactPhone,
             "nearbyPoliceStation": nearbyPoliceStation,
             "additionalDescription": additionalDescription or "",
-            "images": image_base64_list,  # Store base64 encoded images
-            "imageMetadata": processed_images,  # Store metadata with embeddings (embeddings are stored here per image)
+            "imageMetadata": processed_images,  # Per-image media refs, hashes and embeddings
             "createdAt": datetime.now(),
             "updatedAt": datetime.now(),
             "status": "pending"
         }
         
-        # Add audio data if provided
+        # Add audio metadata if provided
         if audio:
-            upload_data["audio"] = audio_base64
             upload_data["audioMetadata"] = audio_metadata
         
         # Save to Firebase "upload" collection
@@ -221,6 +264,8 @@ async def upload_missing_person(
         
         return response_data
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
 
@@ -0,0 +1,112 @@
+"""
+Blob storage for uploaded photos and audio.
+
+Media is stored content-addressed (by SHA-256) outside Firestore, and the
+'upload' document keeps only a small reference to it. This keeps documents
+well under the Firestore size limit and means readers of the collection
+(like the detector) never pay for the media bytes.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+class MediaStore:
+    """Base class for media blob stores."""
+
+    def put(self, data: bytes, content_type: Optional[str] = None, kind: str = "media") -> dict:
+        """
+        Store a blob.
+
+        Args:
+            data: Raw file bytes
+            content_type: MIME type of the file, if known
+            kind: Category used in the storage key (e.g. "images", "audio")
+
+        Returns:
+            Media reference: {"sha256", "size", "contentType", "mediaRef"}
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        content_type = content_type or "application/octet-stream"
+        extension = mimetypes.guess_extension(content_type) or ""
+        key = f"{kind}/{sha256[:2]}/{sha256}{extension}"
+
+        media_ref = self._write(key, data, content_type)
+        return {
+            "sha256": sha256,
+            "size": len(data),
+            "contentType": content_type,
+            "mediaRef": media_ref,
+        }
+
+    def _write(self, key: str, data: bytes, content_type: str) -> str:
+        """Write data under key and return a reference string for it."""
+        raise NotImplementedError
+
+
+class LocalMediaStore(MediaStore):
+    """Stores media on the local filesystem (for development and testing)."""
+
+    def __init__(self, root: str = "media"):
+        self.root = Path(root)
+
+    def _write(self, key: str, data: bytes, content_type: str) -> str:
+        path = self.root / key
+        # Content-addressed: identical files are only written once
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp file per writer, so concurrent uploads of the same bytes
+            # (e.g. a double submit) each replace the destination with identical content
+            fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_name, path)
+            except OSError:
+                if os.path.exists(temp_name):
+                    os.unlink(temp_name)
+                # Another writer stored the same content first
+                if not path.exists():
+                    raise
+        return f"file://{path.resolve().as_posix()}"
+
+
+class FirebaseStorageMediaStore(MediaStore):
+    """Stores media in a Firebase (Google Cloud) Storage bucket."""
+
+    def __init__(self, bucket_name: str):
+        from firebase_admin import storage
+        self.bucket = storage.bucket(bucket_name)
+
+    def _write(self, key: str, data: bytes, content_type: str) -> str:
+        blob = self.bucket.blob(key)
+        # Content-addressed: identical files are only uploaded once
+        if not blob.exists():
+            blob.upload_from_string(data, content_type=content_type)
+        return f"gs://{self.bucket.name}/{key}"
+
+
+def create_media_store() -> MediaStore:
+    """
+    Create the media store configured by environment variables.
+
+    MEDIA_STORE: "local" (default) or "firebase"
+    MEDIA_STORE_PATH: Root directory for the local store (default "media")
+    FIREBASE_STORAGE_BUCKET: Bucket for the firebase store (required for it), e.g.
+                             "<project-id>.appspot.com"
+    """
+    backend = os.getenv("MEDIA_STORE", "local").lower()
+    if backend == "local":
+        return LocalMediaStore(os.getenv("MEDIA_STORE_PATH", "media"))
+    if backend == "firebase":
+        bucket_name = os.getenv("FIREBASE_STORAGE_BUCKET")
+        if not bucket_name:
+            raise ValueError(
+                "MEDIA_STORE=firebase needs FIREBASE_STORAGE_BUCKET set to the Storage bucket name "
+                "(shown in the Firebase console under Storage, e.g. <project-id>.appspot.com)"
+            )
+        return FirebaseStorageMediaStore(bucket_name)
+    raise ValueError(f"Unknown MEDIA_STORE backend: {backend}")